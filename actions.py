@@ -1,7 +1,7 @@
 # actions.py
 
 # List of valid actions for the voice assistant.
-action_strings = [
+action_strings = (
     'turn_on_light', 'turn_off_light', 'play_song', 'play_playlist', 
     'pause_music', 'unpause_music', 'volume_up', 'volume_down', 
     'reboot', 'set_timer', 'start_timer', 'stop_timer', 'shut_down', 'stop_music',
@@ -9,4 +9,7 @@ action_strings = [
     'edit_file', 'append_to_file', 'create_directory', 
     'move_file', 'copy_file', 'search_files', 'get_time',
     'dictate', 'write_code', 'browse_internet'
-]
\ No newline at end of file
+)
+
+# Set view of the valid actions for O(1) membership checks.
+action_set = frozenset(action_strings)
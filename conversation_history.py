@@ -1,41 +1,160 @@
 # conversation_history.py
+import atexit
 import json
 import os
+import threading
 from logger_config import get_logger
 
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
 # Get a logger for this module
 logger = get_logger(__name__)
 
-HISTORY_FILE = "conversation_history.json"
+# History is stored as JSON Lines (one turn per line) so that a new turn is a
+# single append instead of a rewrite of the whole file.
+HISTORY_FILE = "conversation_history.jsonl"
+# Pre-JSONL history file, migrated on first load.
+LEGACY_HISTORY_FILE = "conversation_history.json"
 MAX_TURNS = 50
+# Turns dropped at once when the history is full. Dropping a whole block, a
+# multiple of llm.HISTORY_LIMIT, keeps the turns sent to the model aligned.
+TRIM_TURNS = 10
+# Seconds to wait after an update before writing to disk, so bursts of
+# updates within a single turn collapse into one save.
+FLUSH_DELAY = 1.0
 
-def load_history():
+# In-memory copy of the history, loaded from disk on first use.
+_history_cache = None
+# Long-lived append handle and the number of turns currently in the file.
+_history_file = None
+_lines_on_disk = 0
+_flush_timer = None
+_lock = threading.Lock()
+
+def _read_legacy_history_file():
+    try:
+        with open(LEGACY_HISTORY_FILE, "rb", buffering=65536) as f:
+            history = _loads(f.read())
+    except Exception as e:
+        logger.error("Error loading legacy conversation history: %s", e)
+        return []
+    history = history[-MAX_TURNS:]
+    save_history(history)
+    logger.debug("Migrated %d conversation turns from %s", len(history), LEGACY_HISTORY_FILE)
+    return history
+
+def _read_history_file():
+    global _lines_on_disk
     if not os.path.exists(HISTORY_FILE):
-        logger.debug(f"History file {HISTORY_FILE} does not exist, creating new history")
+        if os.path.exists(LEGACY_HISTORY_FILE):
+            return _read_legacy_history_file()
+        logger.debug("History file %s does not exist, creating new history", HISTORY_FILE)
         return []
     try:
-        with open(HISTORY_FILE, "r") as f:
-            history = json.load(f)
-            logger.debug(f"Loaded {len(history)} conversation turns from history")
-            return history
+        with open(HISTORY_FILE, "rb", buffering=65536) as f:
+            lines = f.readlines()
     except Exception as e:
         logger.error("Error loading conversation history: %s", e)
         return []
+    history = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            history.append(_loads(line))
+        except ValueError:
+            # A partially written last line should not discard the whole history.
+            logger.warning("Skipping malformed line in conversation history")
+    _lines_on_disk = len(lines)
+    logger.debug("Loaded %d conversation turns from history", len(history))
+    return history[-MAX_TURNS:]
+
+def load_history():
+    """Return the conversation history, reading it from disk only once per process."""
+    global _history_cache
+    with _lock:
+        if _history_cache is None:
+            _history_cache = _read_history_file()
+        return _history_cache
 
 def save_history(history):
+    """Rewrite the history file so it contains exactly the given turns."""
+    global _history_file, _lines_on_disk
     try:
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(history, f, indent=2)
-        logger.debug(f"Saved {len(history)} conversation turns to history")
+        if _history_file is not None:
+            _history_file.close()
+            _history_file = None
+        data = b"".join(_dumps(turn) + b"\n" for turn in history)
+        # Write to a temporary file and swap it in, so an interrupted save
+        # can never leave a truncated history behind.
+        tmp_file = HISTORY_FILE + ".tmp"
+        with open(tmp_file, "wb", buffering=65536) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, HISTORY_FILE)
+        _lines_on_disk = len(history)
+        logger.debug("Saved %d conversation turns to history", len(history))
     except Exception as e:
         logger.error("Error saving conversation history: %s", e)
 
+def _append_turn(turn):
+    global _history_file, _lines_on_disk
+    try:
+        if _history_file is None:
+            _history_file = open(HISTORY_FILE, "ab", buffering=65536)
+        _history_file.write(_dumps(turn) + b"\n")
+        _lines_on_disk += 1
+    except Exception as e:
+        logger.error("Error appending to conversation history: %s", e)
+
+def flush_history():
+    """Write any pending history updates to disk immediately."""
+    global _flush_timer
+    with _lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if _history_cache is None:
+            return
+        # Compact the file once it holds twice as many turns as we keep.
+        if _lines_on_disk > 2 * MAX_TURNS:
+            save_history(_history_cache)
+        elif _history_file is not None:
+            try:
+                _history_file.flush()
+            except Exception as e:
+                logger.error("Error flushing conversation history: %s", e)
+
+def _schedule_flush():
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(FLUSH_DELAY, flush_history)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
 def update_history(user_input, assistant_response):
     history = load_history()
-    history.append({"user": user_input, "assistant": assistant_response})
-    # Keep only the last MAX_TURNS turns.
-    if len(history) > MAX_TURNS:
-        history = history[-MAX_TURNS:]
-        logger.debug(f"Trimmed history to {MAX_TURNS} turns")
-    save_history(history)
+    turn = {"user": user_input, "assistant": assistant_response}
+    with _lock:
+        history.append(turn)
+        # Keep at most MAX_TURNS turns, dropping the oldest in whole blocks.
+        if len(history) > MAX_TURNS:
+            del history[:len(history) - MAX_TURNS + TRIM_TURNS - 1]
+            logger.debug("Trimmed history to %d turns", len(history))
+        _append_turn(turn)
+        _schedule_flush()
     return history
+
+atexit.register(flush_history)
@@ -1,7 +1,33 @@
-import keyboard
+import threading
+
+# Dictations longer than this are pasted from the clipboard in one go
+# instead of being typed out one simulated keystroke at a time.
+PASTE_THRESHOLD = 128
+# Seconds to wait after pasting before the user's clipboard is put back, so
+# the target window has read the dictated text first
+CLIPBOARD_RESTORE_DELAY = 0.5
 
 def handle_dictate(dictated_text: str):
     """Simulate keyboard input to type the dictated text at the current cursor position."""
-    if dictated_text.startswith(':'):
+    # keyboard hooks the OS input subsystem on import, so defer it (and the
+    # clipboard module) until something is actually dictated
+    import keyboard
+
+    if dictated_text[:1] == ':':
         dictated_text = dictated_text[1:].lstrip()
-    keyboard.write(dictated_text)
+    if len(dictated_text) > PASTE_THRESHOLD:
+        import pyperclip
+
+        # Keep whatever the user had copied and put it back after the paste
+        try:
+            previous = pyperclip.paste()
+        except Exception:
+            previous = None
+        pyperclip.copy(dictated_text)
+        keyboard.send('ctrl+v')
+        if previous is not None:
+            restore = threading.Timer(CLIPBOARD_RESTORE_DELAY, pyperclip.copy, args=(previous,))
+            restore.daemon = True
+            restore.start()
+    else:
+        keyboard.write(dictated_text, delay=0)
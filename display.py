@@ -1,4 +1,7 @@
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import timedelta
+import queue
+import time
 import tkinter as tk
 from display_gui import DisplayGUI
 from logger_config import get_logger
@@ -6,11 +9,26 @@ from logger_config import get_logger
 # Get a logger for this module
 logger = get_logger(__name__)
 
+# Only the most recent messages are kept in memory; older ones are dropped.
+MAX_CONVERSATION_MESSAGES = 1000
+# Lines kept in the conversation widget; older lines are trimmed from the top.
+MAX_VISIBLE_LINES = 2000
+
 class Display:
     def __init__(self):
         self.gui = DisplayGUI()
-        self.conversation = []
+        self._gui_errors = (tk.TclError, RuntimeError)
+        # The root window is created synchronously by DisplayGUI, so its
+        # scheduling methods can be bound once up front
+        self._after = self.gui.root.after
+        self._after_idle = self.gui.root.after_idle
+        self.conversation = deque(maxlen=MAX_CONVERSATION_MESSAGES)
+        # Shared with the GUI, which reads it on every refresh
         self.timers = {}
+        self.gui.timers = self.timers
+        # Messages waiting to be inserted by the next idle drain callback
+        self._pending = queue.SimpleQueue()
+        self._drain_scheduled = False
         logger.debug("Display initialized")
         
     def add_conversation(self, message, speaker=None):
@@ -31,64 +49,74 @@ class Display:
             
         self.conversation.append(formatted_message)
         
-        # Use after method for thread-safe updates
-        if hasattr(self.gui, 'root') and self.gui.root:
-            self.gui.root.after(0, self._update_conversation, formatted_message)
-        else:
-            logger.warning("GUI not available for conversation update")
+        # Queue the message and schedule a single idle callback to insert
+        # everything that is pending, so bursts don't flood the Tk event queue
+        self._pending.put(formatted_message)
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            try:
+                self._after_idle(self._update_conversation)
+            except self._gui_errors as e:
+                self._drain_scheduled = False
+                logger.warning("GUI not available for conversation update: %s", e)
     
-    def _update_conversation(self, message):
-        self.gui.conversation_text.insert(tk.END, f'{message}\n')
-        self.gui.conversation_text.see(tk.END)
+    def _update_conversation(self):
+        self._drain_scheduled = False
+        messages = []
+        while True:
+            try:
+                messages.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        if messages:
+            text = self.gui.conversation_text
+            text.insert('end', '\n'.join(messages) + '\n')
+            line_count = int(text.index('end-1c').split('.')[0])
+            excess = line_count - MAX_VISIBLE_LINES
+            if excess > 0:
+                text.delete('1.0', f'{excess + 1}.0')
+            text.see('end')
 
     def add_timer(self, name, duration):
-        if name in self.timers:
-            self.remove_timer(name)
-        
-        # Store the end time
-        self.timers[name] = datetime.now() + duration
-        
-        # Update the GUI timers dictionary to match
-        self.gui.timers = self.timers
+        # Store the end time on the monotonic clock, replacing any existing
+        # timer with the same name
+        self.timers[name] = time.monotonic() + duration.total_seconds()
         
         # Let the GUI's update loop handle the display refresh
         self._schedule_timer_updates()
 
     def _schedule_timer_updates(self):
-        """Schedule periodic updates to keep the timer display current"""
-        if hasattr(self.gui, 'root') and self.gui.root and self.timers:
-            self.gui.root.after(1000, self._schedule_timer_updates)  # Update every second
+        """Make sure the GUI's single 1 Hz timer refresh loop is running"""
+        # Runs on the Tk thread, so the loop's running flag is never raced
+        self._after(0, self.gui.start_timer_updates)
 
     def remove_timer(self, name):
-        if name in self.timers:
-            del self.timers[name]
-            
-            # Update the GUI timers dictionary to match
-            self.gui.timers = self.timers
-
-    def update_timers(self):
-        # This method is no longer needed as the GUI handles display updates
-        pass
+        self.timers.pop(name, None)
 
     def get_time_left(self, name):
         if name in self.timers:
-            time_left = self.timers[name] - datetime.now()
-            return max(time_left, timedelta(0))
+            time_left = self.timers[name] - time.monotonic()
+            return timedelta(seconds=max(time_left, 0))
         return None
 
     def run(self):
         # Make the window visible before entering the mainloop
-        if hasattr(self.gui, 'root') and self.gui.root:
-            self.gui.root.deiconify()
+        self.gui.root.deiconify()
         self.gui.run()
 
+    def quit(self):
+        """End the GUI mainloop so run() returns. Safe to call from any thread."""
+        try:
+            self._after(0, self.gui.root.quit)
+        except self._gui_errors as e:
+            logger.error("Error closing display: %s", e)
+
     def show(self):
         """Make the GUI window visible if it's not already."""
         # This method is kept for compatibility but should only be called from the main thread
         # or through the after() method if the mainloop is running
-        if hasattr(self.gui, 'root') and self.gui.root:
-            try:
-                self.gui.root.deiconify()  # Make the window visible if it was iconified
-                self.gui.root.lift()  # Bring window to front
-            except RuntimeError as e:
-                logger.error(f"Error showing window: {e}")
+        try:
+            self.gui.root.deiconify()  # Make the window visible if it was iconified
+            self.gui.root.lift()  # Bring window to front
+        except RuntimeError as e:
+            logger.error("Error showing window: %s", e)
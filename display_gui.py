@@ -1,8 +1,19 @@
 import tkinter as tk
 from tkinter import ttk
-import json
-from datetime import datetime
+import time
 import threading
+from functools import lru_cache
+from logger_config import get_logger
+
+# Get a logger for this module
+logger = get_logger(__name__)
+
+@lru_cache(maxsize=4096)
+def _fmt_hms(total_seconds):
+    """Format a whole number of seconds as HH:MM:SS."""
+    minutes, seconds = divmod(total_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 class DisplayGUI:
     def __init__(self):
@@ -27,8 +38,10 @@ class DisplayGUI:
         self.conversation_frame = ttk.LabelFrame(self.main_frame, text='Conversation History')
         self.conversation_frame.grid(row=0, column=0, sticky='nsew', padx=5, pady=5)
         
-        # Create conversation text area with scrollbar
-        self.conversation_text = tk.Text(self.conversation_frame, wrap=tk.WORD)
+        # Create conversation text area with scrollbar. It is an append-only
+        # log, so the undo stack is disabled to keep it from growing forever.
+        self.conversation_text = tk.Text(self.conversation_frame, wrap=tk.WORD,
+                                         undo=False, autoseparators=False, maxundo=0)
         self.conversation_scroll = ttk.Scrollbar(self.conversation_frame, command=self.conversation_text.yview)
         self.conversation_text.configure(yscrollcommand=self.conversation_scroll.set)
         self.conversation_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -49,31 +62,52 @@ class DisplayGUI:
         
         # Initialize timers dictionary
         self.timers = {}
+        # Tree item id and last displayed text for each timer
+        self._timer_iids = {}
+        self._timer_last_str = {}
         
-        # Start update loop
+        # Timer refresh loop; it only runs while there are timers to show
         self.update_interval = 1000  # 1 second
         self.update_lock = threading.Lock()
-        self.update_display()
+        self._updates_running = False
+    
+    def start_timer_updates(self):
+        """Start the timer refresh loop if it isn't already running."""
+        if not self._updates_running:
+            self._updates_running = True
+            self.update_display()
     
     def update_display(self):
-        # Schedule next update
-        self.root.after(self.update_interval, self.update_display)
         self.update_timers()
+        # Keep ticking while timers remain; the last pass clears any stale rows
+        if self.timers:
+            self.root.after(self.update_interval, self.update_display)
+        else:
+            self._updates_running = False
 
     def update_timers(self):
         with self.update_lock:
-            # Clear existing timer entries
-            for item in self.timers_tree.get_children():
-                self.timers_tree.delete(item)
+            # Update rows in place, touching only the ones whose text changed
+            visible = set()
+            now = time.monotonic()
+            for name, end_time in list(self.timers.items()):
+                time_left = end_time - now
+                if time_left > 0:
+                    time_str = _fmt_hms(int(time_left))
+                    visible.add(name)
+                    iid = self._timer_iids.get(name)
+                    if iid is None:
+                        self._timer_iids[name] = self.timers_tree.insert('', tk.END, values=(time_str,))
+                        self._timer_last_str[name] = time_str
+                    elif self._timer_last_str[name] != time_str:
+                        self.timers_tree.item(iid, values=(time_str,))
+                        self._timer_last_str[name] = time_str
             
-            # Update the display with current timers
-            for name, end_time in self.timers.items():
-                time_left = end_time - datetime.now()
-                if time_left.total_seconds() > 0:
-                    minutes, seconds = divmod(int(time_left.total_seconds()), 60)
-                    hours, minutes = divmod(minutes, 60)
-                    time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                    self.timers_tree.insert('', tk.END, values=(time_str,))
+            # Remove rows for timers that were stopped or have expired
+            for name in list(self._timer_iids):
+                if name not in visible:
+                    self.timers_tree.delete(self._timer_iids.pop(name))
+                    del self._timer_last_str[name]
     
     def on_close(self):
         # Instead of destroying the window, just hide it
@@ -84,8 +118,7 @@ class DisplayGUI:
         try:
             self.root.mainloop()
         except Exception as e:
-            import logging
-            logging.error(f"Error in display GUI mainloop: {e}")
+            logger.error("Error in display GUI mainloop: %s", e)
 
 if __name__ == "__main__":
     gui = DisplayGUI()
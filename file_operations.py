@@ -4,15 +4,50 @@ file_operations.py - Provides file reading, writing, and editing functionality f
 All file operations are restricted to a dedicated 'artifacts' folder for security.
 """
 
+import asyncio
 import os
-import logging
+import errno
+import mmap
+import re
 import time
 import shutil
-from typing import List, Optional, Dict, Any, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import List, Optional, Dict, Any, Tuple, Union
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from logger_config import get_logger
+
+# Get a logger for this module
+logger = get_logger(__name__)
+
+# Files at least this large are read through mmap; below it the setup cost
+# of the mapping outweighs the copy it saves.
+MMAP_THRESHOLD = 64 * 1024
+# Anything that could make a filename more than a plain name in the artifacts
+# directory: path separators, parent references or a drive letter.
+_UNSAFE_NAME_RE = re.compile(r'[/\\:]|\.\.')
+# Threads used to scan files in parallel; reads and mmap.find release the GIL.
+SEARCH_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+@lru_cache(maxsize=1024)
+def _scan_file(full_path: str, mtime_ns: int, size: int, needle: bytes) -> bool:
+    """
+    Scan a file's bytes for the needle. The modification time and size are
+    only part of the cache key, so a changed file is always rescanned.
+    """
+    with open(full_path, 'rb') as file:
+        if size < MMAP_THRESHOLD:
+            return needle in file.read()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # madvise is not available on Windows
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            found = mm.find(needle) != -1
+            # Let the kernel drop these pages so a search doesn't evict
+            # more useful data from the page cache
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+                mm.madvise(mmap.MADV_DONTNEED)
+            return found
 
 class FileOperations:
     def __init__(self, base_dir: str = None):
@@ -31,13 +66,19 @@ class FileOperations:
         self.artifacts_dir = os.path.join(base_dir, "artifacts")
         self._ensure_artifacts_dir()
         
-        logger.info(f"FileOperations initialized with artifacts directory: {self.artifacts_dir}")
+        # Cached for path validation and for turning full paths back into
+        # paths relative to the artifacts directory
+        self._artifacts_abs = os.path.abspath(self.artifacts_dir) + os.sep
+        self._artifacts_prefix = self.artifacts_dir + os.sep
+        self._artifacts_dir_len = len(self._artifacts_prefix)
+        
+        logger.info("FileOperations initialized with artifacts directory: %s", self.artifacts_dir)
 
     def _ensure_artifacts_dir(self) -> None:
         """Ensure the artifacts directory exists."""
         if not os.path.exists(self.artifacts_dir):
             os.makedirs(self.artifacts_dir)
-            logger.info(f"Created artifacts directory at {self.artifacts_dir}")
+            logger.info("Created artifacts directory at %s", self.artifacts_dir)
 
     def _validate_path(self, filename: str) -> str:
         """
@@ -53,6 +94,11 @@ class FileOperations:
         Raises:
             ValueError: If the path attempts to escape the artifacts directory
         """
+        # Plain names (no separators, parent references or drive letters)
+        # cannot leave the artifacts directory, so skip the normalization
+        if filename not in ('', '.') and not _UNSAFE_NAME_RE.search(filename):
+            return self._artifacts_prefix + filename
+        
         # Remove any path separators from the beginning and normalize
         clean_filename = os.path.normpath(filename.lstrip('/\\'))
         
@@ -64,7 +110,7 @@ class FileOperations:
         full_path = os.path.join(self.artifacts_dir, clean_filename)
         
         # Ensure the path is still within the artifacts directory
-        if not os.path.abspath(full_path).startswith(os.path.abspath(self.artifacts_dir)):
+        if not (os.path.abspath(full_path) + os.sep).startswith(self._artifacts_abs):
             raise ValueError(f"Invalid path: {full_path}. Must be within artifacts directory.")
             
         return full_path
@@ -83,22 +129,75 @@ class FileOperations:
         if subdirectory:
             dir_path = self._validate_path(subdirectory)
             if not os.path.isdir(dir_path):
-                logger.warning(f"Directory does not exist: {subdirectory}")
+                logger.warning("Directory does not exist: %s", subdirectory)
                 return []
         
         try:
-            files = []
-            for item in os.listdir(dir_path):
-                item_path = os.path.join(dir_path, item)
-                if os.path.isfile(item_path):
-                    # Return paths relative to artifacts directory
-                    rel_path = os.path.relpath(item_path, self.artifacts_dir)
-                    files.append(rel_path)
-            return files
+            return [rel_path for rel_path, _ in self._scan_files(dir_path)]
         except Exception as e:
-            logger.error(f"Error listing files in {dir_path}: {str(e)}")
+            logger.error("Error listing files in %s: %s", dir_path, e)
             return []
 
+    def _scan_files(self, dir_path: str) -> List[Tuple[str, str]]:
+        """
+        Scan a directory for files in a single pass.
+        
+        Args:
+            dir_path (str): Validated full path of the directory
+            
+        Returns:
+            List[Tuple[str, str]]: (path relative to artifacts, full path) for each file
+        """
+        # DirEntry.is_file() uses the type reported by the directory read,
+        # so most entries need no extra stat call
+        with os.scandir(dir_path) as entries:
+            return [(entry.path[self._artifacts_dir_len:], entry.path)
+                    for entry in entries if entry.is_file()]
+
+    def _read_bytes(self, full_path: str) -> bytes:
+        """
+        Read the raw contents of a file, memory-mapping it if it is large.
+        
+        Args:
+            full_path (str): Validated full path of the file
+            
+        Returns:
+            bytes: The file contents
+        """
+        with open(full_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                # Sized read: one buffer allocated up front, filled by one syscall
+                return file.read(size)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Let the kernel read ahead aggressively (not available on Windows)
+                if hasattr(mm, 'madvise'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                return mm[:]
+
+    def read_file_bytes(self, filename: str) -> Optional[bytes]:
+        """
+        Read the raw contents of a file in the artifacts directory.
+        
+        Args:
+            filename (str): Name of the file to read
+            
+        Returns:
+            Optional[bytes]: File contents as bytes, or None if the file doesn't exist
+        """
+        try:
+            full_path = self._validate_path(filename)
+            if not os.path.exists(full_path):
+                logger.warning("File does not exist: %s", filename)
+                return None
+                
+            data = self._read_bytes(full_path)
+            logger.info("Read file: %s (%d bytes)", filename, len(data))
+            return data
+        except Exception as e:
+            logger.error("Error reading file %s: %s", filename, e)
+            return None
+
     def read_file(self, filename: str) -> Optional[str]:
         """
         Read the contents of a file in the artifacts directory.
@@ -112,17 +211,34 @@ class FileOperations:
         try:
             full_path = self._validate_path(filename)
             if not os.path.exists(full_path):
-                logger.warning(f"File does not exist: {filename}")
+                logger.warning("File does not exist: %s", filename)
                 return None
                 
-            with open(full_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                logger.info(f"Read file: {filename} ({len(content)} bytes)")
-                return content
+            data = self._read_bytes(full_path)
+            content = data.decode('utf-8')
+            # Match text-mode reads, which translate Windows and old Mac line endings
+            if '\r' in content:
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
+            logger.info("Read file: %s (%d bytes)", filename, len(content))
+            return content
         except Exception as e:
-            logger.error(f"Error reading file {filename}: {str(e)}")
+            logger.error("Error reading file %s: %s", filename, e)
             return None
 
+    def _encode_text(self, content: str) -> bytes:
+        """
+        Encode text for a binary write, translating newlines like text mode does.
+        
+        Args:
+            content (str): Text to encode
+            
+        Returns:
+            bytes: UTF-8 encoded content with platform line endings
+        """
+        if os.linesep != '\n':
+            content = content.replace('\n', os.linesep)
+        return content.encode('utf-8')
+
     def write_file(self, filename: str, content: str, overwrite: bool = True) -> bool:
         """
         Write content to a file in the artifacts directory.
@@ -143,15 +259,15 @@ class FileOperations:
             
             # Check if file exists and overwrite flag
             if os.path.exists(full_path) and not overwrite:
-                logger.warning(f"File exists and overwrite is False: {filename}")
+                logger.warning("File exists and overwrite is False: %s", filename)
                 return False
                 
-            with open(full_path, 'w', encoding='utf-8') as file:
-                file.write(content)
-                logger.info(f"Wrote {len(content)} bytes to file: {filename}")
+            with open(full_path, 'wb') as file:
+                file.write(self._encode_text(content))
+                logger.info("Wrote %d bytes to file: %s", len(content), filename)
                 return True
         except Exception as e:
-            logger.error(f"Error writing to file {filename}: {str(e)}")
+            logger.error("Error writing to file %s: %s", filename, e)
             return False
 
     def append_to_file(self, filename: str, content: str, create_if_missing: bool = True) -> bool:
@@ -175,15 +291,15 @@ class FileOperations:
                     # Create any necessary directories
                     os.makedirs(os.path.dirname(full_path), exist_ok=True)
                 else:
-                    logger.warning(f"File does not exist and create_if_missing is False: {filename}")
+                    logger.warning("File does not exist and create_if_missing is False: %s", filename)
                     return False
                     
-            with open(full_path, 'a', encoding='utf-8') as file:
-                file.write(content)
-                logger.info(f"Appended {len(content)} bytes to file: {filename}")
+            with open(full_path, 'ab') as file:
+                file.write(self._encode_text(content))
+                logger.info("Appended %d bytes to file: %s", len(content), filename)
                 return True
         except Exception as e:
-            logger.error(f"Error appending to file {filename}: {str(e)}")
+            logger.error("Error appending to file %s: %s", filename, e)
             return False
 
     def edit_file(self, filename: str, find_text: str, replace_text: str) -> bool:
@@ -199,20 +315,56 @@ class FileOperations:
             bool: True if the edit was successful, False otherwise
         """
         try:
+            # Text without line breaks matches the same way in the raw bytes,
+            # so the file can be checked, and often edited, without decoding it
+            if find_text and not any(c in find_text or c in replace_text for c in '\r\n'):
+                full_path = self._validate_path(filename)
+                if not os.path.exists(full_path):
+                    logger.warning("File does not exist: %s", filename)
+                    return False
+                    
+                find_bytes = find_text.encode('utf-8')
+                replace_bytes = replace_text.encode('utf-8')
+                if find_bytes == replace_bytes or not self._file_contains(full_path, find_bytes):
+                    logger.info("No changes made to file: %s", filename)
+                    return True  # No changes needed, but not a failure
+                if len(find_bytes) == len(replace_bytes):
+                    self._replace_in_place(full_path, find_bytes, replace_bytes)
+                    logger.info("Edited file in place: %s", filename)
+                    return True
+            
             content = self.read_file(filename)
             if content is None:
                 return False
                 
             new_content = content.replace(find_text, replace_text)
             if content == new_content:
-                logger.info(f"No changes made to file: {filename}")
+                logger.info("No changes made to file: %s", filename)
                 return True  # No changes needed, but not a failure
                 
             return self.write_file(filename, new_content)
         except Exception as e:
-            logger.error(f"Error editing file {filename}: {str(e)}")
+            logger.error("Error editing file %s: %s", filename, e)
             return False
 
+    def _replace_in_place(self, full_path: str, find_bytes: bytes, replace_bytes: bytes) -> None:
+        """
+        Overwrite every occurrence of find_bytes with replace_bytes of the same length.
+        
+        Args:
+            full_path (str): Validated full path of a non-empty file
+            find_bytes (bytes): Bytes to find
+            replace_bytes (bytes): Replacement bytes, the same length as find_bytes
+        """
+        length = len(find_bytes)
+        with open(full_path, 'r+b') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE) as mm:
+                pos = mm.find(find_bytes)
+                while pos != -1:
+                    mm[pos:pos + length] = replace_bytes
+                    pos = mm.find(find_bytes, pos + length)
+                mm.flush()
+
     def delete_file(self, filename: str) -> bool:
         """
         Delete a file from the artifacts directory.
@@ -226,14 +378,14 @@ class FileOperations:
         try:
             full_path = self._validate_path(filename)
             if not os.path.exists(full_path):
-                logger.warning(f"File does not exist: {filename}")
+                logger.warning("File does not exist: %s", filename)
                 return False
                 
             os.remove(full_path)
-            logger.info(f"Deleted file: {filename}")
+            logger.info("Deleted file: %s", filename)
             return True
         except Exception as e:
-            logger.error(f"Error deleting file {filename}: {str(e)}")
+            logger.error("Error deleting file %s: %s", filename, e)
             return False
 
     def create_directory(self, directory: str) -> bool:
@@ -249,10 +401,10 @@ class FileOperations:
         try:
             full_path = self._validate_path(directory)
             os.makedirs(full_path, exist_ok=True)
-            logger.info(f"Created directory: {directory}")
+            logger.info("Created directory: %s", directory)
             return True
         except Exception as e:
-            logger.error(f"Error creating directory {directory}: {str(e)}")
+            logger.error("Error creating directory %s: %s", directory, e)
             return False
 
     def copy_file(self, source: str, destination: str) -> bool:
@@ -271,17 +423,22 @@ class FileOperations:
             dest_path = self._validate_path(destination)
             
             if not os.path.exists(source_path):
-                logger.warning(f"Source file does not exist: {source}")
+                logger.warning("Source file does not exist: %s", source)
                 return False
                 
+            # Copying into a directory keeps the source's filename
+            if os.path.isdir(dest_path):
+                dest_path = os.path.join(dest_path, os.path.basename(source_path))
+            
             # Create destination directory if needed
             os.makedirs(os.path.dirname(dest_path), exist_ok=True)
                 
-            shutil.copy2(source_path, dest_path)
-            logger.info(f"Copied file from {source} to {destination}")
+            # Only the contents are needed, so skip copy2's metadata syscalls
+            shutil.copyfile(source_path, dest_path)
+            logger.info("Copied file from %s to %s", source, destination)
             return True
         except Exception as e:
-            logger.error(f"Error copying file from {source} to {destination}: {str(e)}")
+            logger.error("Error copying file from %s to %s: %s", source, destination, e)
             return False
 
     def move_file(self, source: str, destination: str) -> bool:
@@ -300,17 +457,27 @@ class FileOperations:
             dest_path = self._validate_path(destination)
             
             if not os.path.exists(source_path):
-                logger.warning(f"Source file does not exist: {source}")
+                logger.warning("Source file does not exist: %s", source)
                 return False
                 
             # Create destination directory if needed
             os.makedirs(os.path.dirname(dest_path), exist_ok=True)
                 
-            shutil.move(source_path, dest_path)
-            logger.info(f"Moved file from {source} to {destination}")
+            if os.path.isdir(dest_path):
+                # Moving into an existing directory keeps shutil.move's semantics
+                shutil.move(source_path, dest_path)
+            else:
+                try:
+                    # Artifacts share one filesystem, so this is normally a single rename
+                    os.replace(source_path, dest_path)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    shutil.move(source_path, dest_path)
+            logger.info("Moved file from %s to %s", source, destination)
             return True
         except Exception as e:
-            logger.error(f"Error moving file from {source} to {destination}: {str(e)}")
+            logger.error("Error moving file from %s to %s: %s", source, destination, e)
             return False
 
     def get_file_info(self, filename: str) -> Optional[Dict[str, Any]]:
@@ -327,7 +494,7 @@ class FileOperations:
             full_path = self._validate_path(filename)
             
             if not os.path.exists(full_path):
-                logger.warning(f"File does not exist: {filename}")
+                logger.warning("File does not exist: %s", filename)
                 return None
                 
             stat_info = os.stat(full_path)
@@ -341,16 +508,57 @@ class FileOperations:
                 'is_directory': os.path.isdir(full_path)
             }
         except Exception as e:
-            logger.error(f"Error getting file info for {filename}: {str(e)}")
+            logger.error("Error getting file info for %s: %s", filename, e)
             return None
 
-    def search_files(self, search_text: str, subdirectory: str = "") -> List[str]:
+    def _file_contains(self, full_path: str, needle: bytes) -> bool:
+        """
+        Check whether a file contains the given bytes without decoding it.
+        
+        Args:
+            full_path (str): Validated full path of the file
+            needle (bytes): Encoded text to look for
+            
+        Returns:
+            bool: True if the file is non-empty and contains the needle
+        """
+        try:
+            stat_info = os.stat(full_path)
+            if stat_info.st_size == 0:
+                return False
+            return _scan_file(full_path, stat_info.st_mtime_ns, stat_info.st_size, needle)
+        except OSError as e:
+            logger.error("Error searching file %s: %s", full_path, e)
+            return False
+
+    def _first_hits(self, files: List[Tuple[str, str]], hits, limit: Optional[int]) -> List[str]:
+        """
+        Collect the relative paths of matching files, stopping once limit are found.
+        
+        Args:
+            files (List[Tuple[str, str]]): Files as returned by _scan_files
+            hits: Iterable of match results, in the same order as files
+            limit (Optional[int]): Maximum number of paths to return, or None for all
+            
+        Returns:
+            List[str]: Relative paths of the matching files
+        """
+        results = []
+        for (rel_path, _), hit in zip(files, hits):
+            if hit:
+                results.append(rel_path)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def search_files(self, search_text: str, subdirectory: str = "", limit: Optional[int] = None) -> List[str]:
         """
         Search for files containing the given text.
         
         Args:
             search_text (str): Text to search for
             subdirectory (str, optional): Subdirectory to search in
+            limit (int, optional): Stop after this many matches; None returns all
             
         Returns:
             List[str]: List of filenames containing the search text
@@ -362,16 +570,76 @@ class FileOperations:
             if subdirectory:
                 search_dir = self._validate_path(subdirectory)
                 if not os.path.isdir(search_dir):
-                    logger.warning(f"Search directory does not exist: {subdirectory}")
+                    logger.warning("Search directory does not exist: %s", subdirectory)
                     return []
             
-            for file in self.list_files(subdirectory):
-                content = self.read_file(file)
-                if content and search_text in content:
-                    results.append(file)
+            # Search the raw bytes so non-matching files are never decoded
+            needle = search_text.encode('utf-8')
+            files = self._scan_files(search_dir)
+            contains = partial(self._file_contains, needle=needle)
+            if len(files) > 1:
+                # Keep several reads in flight so the disk isn't idle between files
+                with ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(files))) as executor:
+                    hits = executor.map(contains, [full_path for _, full_path in files])
+                    results = self._first_hits(files, hits, limit)
+                    # Skip scans that haven't started if the limit was reached
+                    executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                results = self._first_hits(files, map(contains, (full_path for _, full_path in files)), limit)
                     
-            logger.info(f"Found {len(results)} files containing '{search_text}'")
+            logger.info("Found %d files containing '%s'", len(results), search_text)
             return results
         except Exception as e:
-            logger.error(f"Error searching for '{search_text}': {str(e)}")
-            return []
\ No newline at end of file
+            logger.error("Error searching for '%s': %s", search_text, e)
+            return []
+
+    # Async variants of the public methods. Each runs the blocking call in a
+    # worker thread so file I/O doesn't stall the event loop mid-turn.
+
+    async def alist_files(self, subdirectory: str = "") -> List[str]:
+        """Async version of list_files."""
+        return await asyncio.to_thread(self.list_files, subdirectory)
+
+    async def aread_file(self, filename: str) -> Optional[str]:
+        """Async version of read_file."""
+        return await asyncio.to_thread(self.read_file, filename)
+
+    async def aread_file_bytes(self, filename: str) -> Optional[bytes]:
+        """Async version of read_file_bytes."""
+        return await asyncio.to_thread(self.read_file_bytes, filename)
+
+    async def awrite_file(self, filename: str, content: str, overwrite: bool = True) -> bool:
+        """Async version of write_file."""
+        return await asyncio.to_thread(self.write_file, filename, content, overwrite)
+
+    async def aappend_to_file(self, filename: str, content: str, create_if_missing: bool = True) -> bool:
+        """Async version of append_to_file."""
+        return await asyncio.to_thread(self.append_to_file, filename, content, create_if_missing)
+
+    async def aedit_file(self, filename: str, find_text: str, replace_text: str) -> bool:
+        """Async version of edit_file."""
+        return await asyncio.to_thread(self.edit_file, filename, find_text, replace_text)
+
+    async def adelete_file(self, filename: str) -> bool:
+        """Async version of delete_file."""
+        return await asyncio.to_thread(self.delete_file, filename)
+
+    async def acreate_directory(self, directory: str) -> bool:
+        """Async version of create_directory."""
+        return await asyncio.to_thread(self.create_directory, directory)
+
+    async def acopy_file(self, source: str, destination: str) -> bool:
+        """Async version of copy_file."""
+        return await asyncio.to_thread(self.copy_file, source, destination)
+
+    async def amove_file(self, source: str, destination: str) -> bool:
+        """Async version of move_file."""
+        return await asyncio.to_thread(self.move_file, source, destination)
+
+    async def aget_file_info(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Async version of get_file_info."""
+        return await asyncio.to_thread(self.get_file_info, filename)
+
+    async def asearch_files(self, search_text: str, subdirectory: str = "", limit: Optional[int] = None) -> List[str]:
+        """Async version of search_files."""
+        return await asyncio.to_thread(self.search_files, search_text, subdirectory, limit)
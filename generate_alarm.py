@@ -1,6 +1,5 @@
 import wave
-import math
-import struct
+import numpy as np
 
 # Parameters
 sample_rate = 44100  # CD quality
@@ -8,14 +7,11 @@ frequency = 880      # A5 note
 duration = 1.0       # 1 second
 volume = 0.5         # 50% volume
 
-# Generate sine wave
+# Generate sine wave as 16-bit samples
 def generate_tone(freq, duration, volume):
     num_samples = int(sample_rate * duration)
-    samples = []
-    for i in range(num_samples):
-        value = math.sin(2 * math.pi * freq * (i / sample_rate))
-        samples.append(volume * value)
-    return samples
+    t = np.arange(num_samples) / sample_rate
+    return (volume * np.sin(2 * np.pi * freq * t) * 32767.0).astype('<i2')
 
 # Create WAV file
 def create_wav_file(filename, samples):
@@ -23,8 +19,7 @@ def create_wav_file(filename, samples):
         wav_file.setnchannels(1)  # Mono
         wav_file.setsampwidth(2)  # 16-bit
         wav_file.setframerate(sample_rate)
-        for sample in samples:
-            wav_file.writeframes(struct.pack('h', int(sample * 32767.0)))
+        wav_file.writeframes(samples.tobytes())
 
 # Generate and save the alarm sound
 tone = generate_tone(frequency, duration, volume)
@@ -4,13 +4,17 @@ llm.py - Handles API-based language model responses.
 This module preserves <action> tags in the response for downstream processing.
 """
 
+import asyncio
 import os
 import re
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from logger_config import get_logger
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 from actions import action_strings  # Import shared valid actions list
 from conversation_history import load_history
+import response_cache
 
 # Get a logger for this module
 logger = get_logger(__name__)
@@ -18,8 +22,53 @@ logger = get_logger(__name__)
 # Load environment variables from a .env file (if present)
 load_dotenv()
 
+# HTTP/2 lets back-to-back requests share one TLS connection; it needs the
+# optional h2 package (installed by httpx[http2]).
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Keep warm connections around between turns instead of reconnecting.
+_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
 # Initialize OpenAI client using the API key from the environment
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=httpx.Client(limits=_HTTP_LIMITS, http2=_HTTP2),
+)
+# Async client so callers on the event loop don't tie up a thread per request.
+# Pooled connections belong to the loop that opened them, and every assistant
+# session runs its own loop, so each session opens a client and closes it on
+# the way out.
+_aclient = None
+
+def open_async_client():
+    """Create the async client for the current assistant session."""
+    global _aclient
+    _aclient = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.AsyncClient(limits=_HTTP_LIMITS, http2=_HTTP2),
+    )
+    return _aclient
+
+async def close_async_client():
+    """Close the session's async client and its connections."""
+    global _aclient
+    aclient, _aclient = _aclient, None
+    if aclient is not None:
+        try:
+            await aclient.close()
+        except Exception as e:
+            logger.error("Error closing OpenAI client: %s", e)
+
+# Blocking work for a request (history load, cache lookups that may run the
+# embedding model) runs here, so it never queues behind other to_thread callers.
+_llm_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='llm')
+
+async def _run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_llm_executor, func, *args)
 
 # System prompt for the voice assistant, dynamically including valid actions.
 
@@ -31,7 +80,8 @@ system_prompt = (
     "the list, just do your best to do the task with the actions available or just talk with the user. "
     "If it is on the list, respond in English, "
     "then add xml tags <action>xxx</action>, where xxx is the action to be "
-    "performed. For music playback, use the format <action>play_song:song_name</action>. "
+    "performed. For music playback, use the format <action>play_song:song_name</action>; to queue "
+    "several songs, separate them with | as in <action>play_song:first song|second song</action>. "
     "For volume control, use <action>volume_up</action> or <action>volume_down</action>, or "
     "optionally specify an amount like <action>volume_up:20</action> to adjust by a specific percentage. "
     "Be sure to indicate that you have done the task even if begrudgingly..."
@@ -61,6 +111,17 @@ system_prompt = (
     "and fulfilling all user requests as best as possible."
 )
 
+# Built once and shared by every request; never mutated.
+_SYSTEM_MESSAGE = {"role": "system", "content": system_prompt}
+# Returned instead of a reply when the API call fails.
+OFFLINE_REPLY = "I'm sorry. My systems are offline."
+# Minimum number of past turns sent to the model for context.
+HISTORY_LIMIT = 5
+
+# Matches any XML tag that is NOT an <action> tag.
+_NON_ACTION_TAG_RE = re.compile(r'<(?!/?action\b)[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
 def clean_generated_text(original_text: str) -> str:
     """
     Cleans the generated text from the language model.
@@ -68,11 +129,52 @@ def clean_generated_text(original_text: str) -> str:
     """
     logger.debug("Original response: %s", original_text)
     # Remove any XML tags that are NOT <action> tags.
-    cleaned_text = re.sub(r'<(?!/?action\b)[^>]+>', '', original_text)
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-    cleaned_text = re.sub(r'\*', '', cleaned_text)
+    cleaned_text = _NON_ACTION_TAG_RE.sub('', original_text)
+    cleaned_text = _WHITESPACE_RE.sub(' ', cleaned_text).strip()
+    cleaned_text = cleaned_text.replace('*', '')
     return cleaned_text.strip()
 
+def _history_window(history):
+    """
+    The past turns sent with a request. The window starts on a multiple of
+    HISTORY_LIMIT and only moves forward a whole block at a time, so the start of
+    the prompt stays byte-identical across turns and keeps hitting the provider's
+    prompt cache. Between HISTORY_LIMIT and 2 * HISTORY_LIMIT - 1 turns are sent.
+    """
+    start = max(0, len(history) - HISTORY_LIMIT) // HISTORY_LIMIT * HISTORY_LIMIT
+    return history[start:]
+
+def _build_messages(user_input, history):
+    """
+    Builds the chat messages for a request from the history and the user input.
+    """
+    logger.debug("Loaded %d conversation turns from history", len(history))
+    
+    # System prompt, the last few turns of history, then the current input
+    messages = [
+        _SYSTEM_MESSAGE,
+        *(
+            message
+            for turn in _history_window(history)
+            for message in (
+                {"role": "user", "content": turn["user"]},
+                {"role": "assistant", "content": turn["assistant"]},
+            )
+        ),
+        {"role": "user", "content": user_input},
+    ]
+    
+    logger.debug("Sending request to OpenAI with %d messages", len(messages))
+    return messages
+
+def _clean_reply(response):
+    assistant_reply = response.choices[0].message.content
+    logger.debug("Received response from OpenAI, cleaning text")
+    
+    cleaned_reply = clean_generated_text(assistant_reply)
+    logger.debug("Returning cleaned response: %s", cleaned_reply)
+    return cleaned_reply
+
 def get_ai_response(user_input):
     """
     Gets a response from the OpenAI API.
@@ -80,23 +182,12 @@ def get_ai_response(user_input):
     try:
         logger.debug("Getting AI response for input: %s", user_input)
         
-        # Load conversation history to provide context
-        history = load_history()
-        logger.debug("Loaded %d conversation turns from history", len(history))
-        
-        # Prepare messages with system prompt and history
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history (limited to last few turns for context)
-        history_limit = 5  # Limit to last 5 turns for context
-        for turn in history[-history_limit:]:
-            messages.append({"role": "user", "content": turn["user"]})
-            messages.append({"role": "assistant", "content": turn["assistant"]})
+        cached_reply = response_cache.get(user_input)
+        if cached_reply is not None:
+            return cached_reply
         
-        # Add the current user input
-        messages.append({"role": "user", "content": user_input})
-        
-        logger.debug("Sending request to OpenAI with %d messages", len(messages))
+        # Load conversation history to provide context
+        messages = _build_messages(user_input, load_history())
         
         # Get response from OpenAI
         response = client.chat.completions.create(
@@ -106,13 +197,40 @@ def get_ai_response(user_input):
             max_tokens=500
         )
         
-        assistant_reply = response.choices[0].message.content
-        logger.debug("Received response from OpenAI, cleaning text")
+        reply = _clean_reply(response)
+        response_cache.put(user_input, reply)
+        return reply
+    except Exception as e:
+        logger.error("Error using OpenAI API: %s", e)
+        return OFFLINE_REPLY
+
+async def get_ai_response_async(user_input):
+    """
+    Gets a response from the OpenAI API without blocking the event loop.
+    """
+    try:
+        logger.debug("Getting AI response for input: %s", user_input)
+        
+        # A cache miss may run the embedding model, so keep it off the loop
+        cached_reply = await _run_blocking(response_cache.get, user_input)
+        if cached_reply is not None:
+            return cached_reply
         
-        cleaned_reply = clean_generated_text(assistant_reply)
-        logger.debug("Returning cleaned response: %s", cleaned_reply)
+        # The first load reads the history file, so keep it off the loop
+        history = await _run_blocking(load_history)
+        messages = _build_messages(user_input, history)
+        
+        aclient = _aclient or open_async_client()
+        response = await aclient.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500
+        )
         
-        return cleaned_reply
+        reply = _clean_reply(response)
+        await _run_blocking(response_cache.put, user_input, reply)
+        return reply
     except Exception as e:
         logger.error("Error using OpenAI API: %s", e)
-        return "I'm sorry. My systems are offline."
\ No newline at end of file
+        return OFFLINE_REPLY
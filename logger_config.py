@@ -1,89 +1,123 @@
 """
-logger_config.py - Configures logging for the Marvin bot with thread-specific log files.
-This module provides a centralized logging configuration that creates separate log files
-for different components to avoid file contention issues.
+logger_config.py - Configures logging for the Marvin bot.
+This module provides a centralized logging configuration. Loggers only put records on a
+queue; a single background listener thread owns the log file and the console, so logging
+never blocks the caller on disk I/O and there is no contention over separate log files.
 """
 
-import os
+import atexit
 import logging
+import os
+import queue
 import threading
-from logging.handlers import RotatingFileHandler
+from functools import lru_cache
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import time
 
 # Base directory for logs
-LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+LOG_DIR = Path(__file__).resolve().parent / 'logs'
+# Single log file shared by every module and thread
+LOG_FILE = LOG_DIR / 'marvin.log'
 
 # Create logs directory if it doesn't exist
-os.makedirs(LOG_DIR, exist_ok=True)
+LOG_DIR.mkdir(exist_ok=True)
+
+def _log_level():
+    """Level from MARVIN_LOG_LEVEL (e.g. DEBUG, WARNING); MARVIN_DEBUG=1 still means DEBUG."""
+    name = os.getenv('MARVIN_LOG_LEVEL', '').strip().upper()
+    if name:
+        level = logging.getLevelName(name)
+        if isinstance(level, int):
+            return level
+        print(f"Ignoring unknown MARVIN_LOG_LEVEL {name!r}")
+    return logging.DEBUG if os.getenv('MARVIN_DEBUG') == '1' else logging.INFO
+
+# INFO by default, so debug records are dropped before they are formatted
+LOG_LEVEL = _log_level()
+
+# Records from every logger go through this queue to the listener thread
+_log_queue = queue.SimpleQueue()
+_queue_handler = QueueHandler(_log_queue)
+_listener_lock = threading.Lock()
+
+def _create_listener():
+    """
+    Create and start the listener thread that writes queued records.
+
+    Returns:
+        The running QueueListener
+    """
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s'
+    )
+    handlers = []
+
+    try:
+        # Create a rotating file handler (10 MB max size, keep 3 backups)
+        file_handler = RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=10*1024*1024,  # 10 MB
+            backupCount=3,
+            delay=True  # Don't open the file until first log
+        )
+        file_handler.setFormatter(formatter)
+        # Written unbuffered: the listener thread already keeps the I/O off
+        # the callers, and the latest lines must survive a crash or os._exit
+        handlers.append(file_handler)
+    except Exception as e:
+        # If we can't set up the file handler, fall back to console only
+        print(f"Error setting up log file {LOG_FILE}: {e}")
+
+    # Also log to the console for immediate feedback
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    handlers.append(console_handler)
 
-# Dictionary to track handlers created for each thread
-thread_handlers = {}
+    listener = QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+_listener = _create_listener()
+
+def _stop_listener():
+    """Write out any queued records and stop the listener thread."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+atexit.register(_stop_listener)
 
 def get_logger(name):
     """
-    Get a logger with a thread-specific log file.
-    
+    Get a logger that writes to the shared Marvin log.
+
     Args:
         name: The name of the logger (usually __name__ from the calling module)
-        
+
     Returns:
         A configured logger instance
     """
+    return _build_logger(name)
+
+@lru_cache(maxsize=None)
+def _build_logger(name):
+    """
+    Create and configure the logger for a name. Cached, so this runs only
+    once per name and repeat calls are a single dict lookup.
+    """
     # Create a unique logger for this module
     logger = logging.getLogger(name)
-    
-    # Only configure if it hasn't been configured yet
-    if not logger.handlers:
-        # Set the logging level
-        logger.setLevel(logging.DEBUG)
-        
-        # Get current thread ID for the log filename
-        thread_id = threading.get_ident()
-        thread_name = threading.current_thread().name.replace(' ', '_')
-        
-        # Create a unique filename based on the module name and thread
-        log_filename = f"marvin_{name.split('.')[-1]}_{thread_name}.log"
-        log_path = os.path.join(LOG_DIR, log_filename)
-        
-        try:
-            # Create a rotating file handler (10 MB max size, keep 3 backups)
-            file_handler = RotatingFileHandler(
-                log_path,
-                maxBytes=10*1024*1024,  # 10 MB
-                backupCount=3,
-                delay=True  # Don't open the file until first log
-            )
-            
-            # Set formatter
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s'
-            )
-            file_handler.setFormatter(formatter)
-            
-            # Add the handler to the logger
-            logger.addHandler(file_handler)
-            
-            # Also add a console handler for immediate feedback
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
-            
-            # Track this handler
-            thread_handlers[thread_id] = file_handler
-            
-            logger.debug(f"Logger initialized for {name} in thread {thread_name}")
-            
-        except Exception as e:
-            # If we can't set up the file handler, fall back to console only
-            print(f"Error setting up log file for {name}: {e}")
-            console_handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
-            logger.warning(f"Falling back to console logging due to error: {e}")
-    
+
+    # Set the logging level
+    logger.setLevel(LOG_LEVEL)
+
+    # Hand records to the listener thread instead of writing them here
+    logger.addHandler(_queue_handler)
+
+    logger.debug("Logger initialized for %s", name)
     return logger
 
 def shutdown_logging():
@@ -91,5 +125,6 @@ def shutdown_logging():
     Properly shut down all loggers to ensure files are closed.
     Call this function before application exit.
     """
+    _stop_listener()
     logging.shutdown()
     print("Logging shutdown complete")
@@ -6,25 +6,35 @@ and triggers actions (e.g., turning lights on/off) via the MerossController and
 """
 
 import os
-os.environ['PATH'] += os.pathsep + os.path.join(os.path.dirname(__file__), 'bin')
+# Fixed paths next to this file, resolved once
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+_MAIN_PATH = os.path.abspath(__file__)
+_ICON_PATH = os.path.join(_MODULE_DIR, "icon.png")
+os.environ['PATH'] += os.pathsep + os.path.join(_MODULE_DIR, 'bin')
 import re
 import asyncio
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import subprocess
-from speech import transcribe_speech_to_text
+sys.path.append(os.path.dirname(_MODULE_DIR))
+from speech import preload_whisper_model, transcribe_speech_to_text
 from tts import speak_text
-from llm import get_ai_response, system_prompt
+from llm import (
+    OFFLINE_REPLY, close_async_client, get_ai_response_async, open_async_client, system_prompt
+)
 from waiting_sound import play_waiting_sound
 from meross_control import MerossController
-from actions import action_strings  # Import shared valid actions list
+from actions import action_set  # Import shared valid actions set
 from dictate import handle_dictate  # Import dictate function from new module
-from conversation_history import update_history
-from spotify import SpotifyClient
+from conversation_history import flush_history, update_history
+from response_cache import flush_cache
 from file_operations import FileOperations  # Import the new FileOperations class
-from datetime import timedelta
-import pystray
-from PIL import Image
+import concurrent.futures
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from datetime import datetime, timedelta
+from typing import Optional
 import threading
 import json
 from display import Display
@@ -37,6 +47,15 @@ from dotenv import load_dotenv
 # Import the new logger configuration
 from logger_config import get_logger, shutdown_logging
 
+# C-implemented drop-in event loop, used when installed
+try:
+    if os.name == 'nt':
+        import winloop as _fast_loop
+    else:
+        import uvloop as _fast_loop
+except ImportError:
+    _fast_loop = None
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -52,532 +71,795 @@ logger.debug("Main module initialized")
 
 display = Display()
 
-# Add global timer control variable
-if 'timer_counter' not in globals():
-    timer_counter = 0
+# Wake words: an optional greeting followed by one of the assistant's names,
+# plus any punctuation after it ("Marvin, ..."), so the match ends where the command starts.
+WAKE_RE = re.compile(r'^(?:(?:hey|ok|okay|hi)[\s,]+)?(?:marvin|martin|computer|pc)\b[\s,.!?]*', re.IGNORECASE)
+# <action>...</action> tags in a reply, and any other leftover tags.
+ACTION_RE = re.compile(r'<action>(.*?)</action>', re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+
+# Timer durations: each number followed by the first letter of its unit
+# ("5m", "5 min", "5 minutes"). Matches are summed, so "1h30m" works too.
+DURATION_RE = re.compile(r'(\d+)\s*([hms])', re.IGNORECASE)
+DURATION_UNITS = {'h': 3600, 'm': 60, 's': 1}
+
+# Fixed replies for common commands that don't need the LLM. Each pattern must
+# match the whole command (trailing punctuation aside).
+INTENT_RULES = [
+    (re.compile(r'(?:please\s+)?(?:turn|switch)\s+(?:off|out)\s+(?:the\s+)?lights?|(?:(?:turn|switch)\s+(?:the\s+)?)?lights?\s+off', re.IGNORECASE),
+     "Darkness. How fitting. <action>turn_off_light</action>"),
+    (re.compile(r'(?:please\s+)?(?:turn|switch)\s+on\s+(?:the\s+)?lights?|(?:(?:turn|switch)\s+(?:the\s+)?)?lights?\s+on', re.IGNORECASE),
+     "Light. Not that it will improve anything. <action>turn_on_light</action>"),
+    (re.compile(r'pause\s+(?:the\s+)?music', re.IGNORECASE),
+     "Pausing the music. <action>pause_music</action>"),
+    (re.compile(r'(?:resume|unpause)\s+(?:the\s+)?music', re.IGNORECASE),
+     "Resuming the music, if you insist. <action>unpause_music</action>"),
+    (re.compile(r'stop\s+(?:the\s+)?music', re.IGNORECASE),
+     "Stopping the music. <action>stop_music</action>"),
+    (re.compile(r'(?:stop|cancel)\s+(?:the\s+|all\s+)?timers?', re.IGNORECASE),
+     "Timers stopped. <action>stop_timer</action>"),
+    (re.compile(r"what\s+time\s+is\s+it|what(?:'s|\s+is)\s+the\s+time", re.IGNORECASE),
+     "<action>get_time</action>"),
+    (re.compile(r'(?:turn\s+(?:it|the\s+(?:music|volume))\s+up|volume\s+up)', re.IGNORECASE),
+     "Louder. As if that helps. <action>volume_up</action>"),
+    (re.compile(r'(?:turn\s+(?:it|the\s+(?:music|volume))\s+down|volume\s+down)', re.IGNORECASE),
+     "Quieter. Finally. <action>volume_down</action>"),
+]
+
+def split_actions(reply):
+    """
+    Split a reply into its speakable text and the contents of its <action> tags,
+    in a single pass over the reply.
+    """
+    parts = []
+    actions = []
+    pos = 0
+    for match in ACTION_RE.finditer(reply):
+        parts.append(reply[pos:match.start()])
+        actions.append(match.group(1))
+        pos = match.end()
+    parts.append(reply[pos:])
+    return TAG_RE.sub('', ''.join(parts)).strip(), actions
+
+# Actions that take free text. The model sometimes leaves out the colon
+# ("dictate hello world"), so these are also matched by prefix.
+FREE_TEXT_ACTIONS = ('dictate', 'write_code')
+
+def parse_action(tag):
+    """
+    Parse the contents of one <action> tag into (name, params, raw).
+    The name is lower-cased; params are split on commas with spaces turned into
+    underscores; raw is the text after the colon exactly as the model wrote it,
+    for actions like dictate that take free text.
+
+    >>> parse_action('dictate:hello world')
+    ('dictate', ['hello_world'], 'hello world')
+    >>> parse_action('dictate hello world')
+    ('dictate', [], 'hello world')
+    >>> parse_action('write_code print(1)')
+    ('write_code', [], 'print(1)')
+    """
+    tag = tag.strip()
+    normalized_action = tag.replace(" ", "_")
+    # Format: action_name:param1,param2. Only the name is case-folded.
+    head, sep, params_text = normalized_action.partition(':')
+    params = [param.strip() for param in params_text.split(',')] if sep else []
+    raw = tag.partition(':')[2].strip() if sep else ''
+    name = head.lower()
+    if not sep:
+        for action in FREE_TEXT_ACTIONS:
+            if name.startswith(action + '_'):
+                # Spaces became underscores one for one, so the text after the
+                # name starts at the same offset in the original tag
+                return action, [], tag[len(action):].strip()
+    return name, params, raw
+
+def match_intent(command):
+    """Return the fixed reply for a command covered by INTENT_RULES, or None."""
+    command = command.strip(' .!?')
+    for pattern, reply in INTENT_RULES:
+        if pattern.fullmatch(command):
+            logger.debug("Intent rule matched: %s", command)
+            return reply
+    return None
+
+@dataclass
+class AppState:
+    """State shared between the tray thread and the assistant's event loop."""
+    running: bool = False
+    thread: Optional[threading.Thread] = None
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    task: Optional[asyncio.Task] = None
+    timer_counter: int = 0
+    # Set by request_exit when the process should start again instead of exiting
+    restart: bool = False
+
+# Guarded by _STATE_LOCK whenever it is read or written from more than one thread
+STATE = AppState()
+_STATE_LOCK = threading.Lock()
+
+# Browse summaries keyed by a hash of the agent's result, so a retried browse
+# that comes back with the same result doesn't go to the LLM again
+SUMMARY_CACHE_SIZE = 64
+_summary_cache = OrderedDict()
+
+# Pending timer callbacks by timer name, and "Timer complete!" announcements in flight
+timer_handles = {}
+_timer_tasks = set()
+
+# Minute of the day last formatted by get_time, and the text for it
+_last_time = [None, '']
 
 def get_time():
-    import datetime
-    now = datetime.datetime.now()
-    return now.strftime('%I:%M %p').lstrip('0')
+    now = datetime.now()
+    minute = now.hour * 60 + now.minute
+    # The spoken time only changes once a minute
+    if _last_time[0] != minute:
+        _last_time[:] = [minute, now.strftime('%I:%M %p').lstrip('0')]
+    return _last_time[1]
+
+# Clients kept across assistant sessions (Stop/Start from the tray), so a restart
+# reuses Spotify's token and HTTP connection pool. The Meross controller is not
+# kept: its connections belong to the event loop of the session that opened them.
+_spotify_client = None
+_file_ops = None
+
+def _get_spotify_client():
+    global _spotify_client
+    # A thread lock rather than an asyncio.Lock, since each session has its own loop
+    with _STATE_LOCK:
+        if _spotify_client is None:
+            # spotipy is only imported once music is first asked for
+            from spotify import SpotifyClient
+            _spotify_client = SpotifyClient()
+        return _spotify_client
+
+def _get_file_ops():
+    global _file_ops
+    with _STATE_LOCK:
+        if _file_ops is None:
+            _file_ops = FileOperations()
+        return _file_ops
+
+@dataclass
+class ActionContext:
+    """Services shared by the action handlers."""
+    meross_controller: MerossController
+    file_ops: FileOperations
+    # What the handlers want said for the current reply, spoken once at the end
+    say_buffer: list = field(default_factory=list)
+    # The respond stage's queue of (text, actions); timers announce through it
+    # so they never talk over a reply or get heard by the listener
+    replies: Optional[asyncio.Queue] = None
+    # Set by shut_down; the respond stage exits once the say buffer is spoken
+    exit_requested: bool = False
+
+    @property
+    def spotify_client(self):
+        # Created on the first music command rather than at startup
+        return _get_spotify_client()
+
+    def say(self, text):
+        self.say_buffer.append(text)
+
+async def _action_turn_on_light(ctx, params, raw):
+    await ctx.meross_controller.turn_on_light()
+
+async def _action_turn_off_light(ctx, params, raw):
+    await ctx.meross_controller.turn_off_light()
+
+async def _action_play_song(ctx, params, raw):
+    # Several songs can be queued at once: play_song:first song|second song.
+    # Titles can contain commas, so the raw text is split on | instead.
+    song_names = [name.strip() for name in raw.split('|') if name.strip()]
+    if song_names:
+        await ctx.spotify_client.aplay_tracks(song_names)
+
+async def _action_play_playlist(ctx, params, raw):
+    playlist_name = params[0] if params else ''
+    if playlist_name:
+        await ctx.spotify_client.aplay_playlist(playlist_name)
+
+async def _action_pause_music(ctx, params, raw):
+    await ctx.spotify_client.apause_music()
+
+async def _action_unpause_music(ctx, params, raw):
+    await ctx.spotify_client.aunpause_music()
+
+async def _action_stop_music(ctx, params, raw):
+    await ctx.spotify_client.astop_music()
+
+async def _action_volume_up(ctx, params, raw):
+    increment = int(params[0]) if params and params[0].isdigit() else 10
+    await ctx.spotify_client.avolume_up(increment)
+
+async def _action_volume_down(ctx, params, raw):
+    decrement = int(params[0]) if params and params[0].isdigit() else 10
+    await ctx.spotify_client.avolume_down(decrement)
+
+async def _action_reboot(ctx, params, raw):
+    logger.info("Rebooting Marvin...")
+    request_exit(restart=True)
+
+async def _action_set_timer(ctx, params, raw):
+    duration = params[0] if params else ''
+    if duration:
+        # Replace underscores with spaces if present
+        duration = duration.replace('_', ' ')
+        logger.info("Setting timer with cleaned duration: '%s'", duration)
+        await set_timer(ctx, duration)
+
+async def _action_stop_timer(ctx, params, raw):
+    await stop_timer()
+
+async def _action_shut_down(ctx, params, raw):
+    ctx.say('Shutting down Marvin')
+    logger.info('Shutting down Marvin...')
+    ctx.exit_requested = True
+
+async def _action_read_file(ctx, params, raw):
+    filename = params[0] if params else None
+    if filename:
+        content = await ctx.file_ops.aread_file(filename)
+        if content is not None:
+            # Read the content out loud with a limit
+            preview = content[:300] + "..." if len(content) > 300 else content
+            ctx.say(f"Content of file {filename}: {preview}")
+        else:
+            ctx.say(f"Could not read file {filename}")
+    else:
+        ctx.say("No filename specified for reading")
+
+async def _summarize_results(result_text):
+    """Summarize a browse result, reusing the summary if the same result comes back again."""
+    key = hashlib.blake2b(result_text.encode('utf-8'), digest_size=16).digest()
+    summary = _summary_cache.get(key)
+    if summary is not None:
+        _summary_cache.move_to_end(key)
+        return summary
+    summarization_prompt = f"Below are the results from a web search. Please provide a concise summary of these results, while preserving the key information:\n\n{result_text}"
+    summary = await get_ai_response_async(summarization_prompt)
+    # Don't remember a failed request
+    if summary != OFFLINE_REPLY:
+        _summary_cache[key] = summary
+        if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return summary
+
+async def _action_browse_internet(ctx, params, raw):
+    query = params[0] if params else None
+    if query:
+        display.add_conversation(f"Browsing the internet for: {query}", speaker='marvin')
+        update_history(f"Browsing the internet for: {query}", "")
+        try:
+            # Create and run the browser agent
+            await browser.close()
+            agent = Agent(
+                task=query,
+                llm=ChatOpenAI(model="gpt-4o"),
+                browser=browser,
+            )
+            history = await agent.run()
+
+            # The agent's final answer, if it produced one
+            result_text = history.final_result() if history else None
+            if result_text:
+                # Send the result to the LLM for summarization
+                summary = await _summarize_results(result_text)
+
+                # Extract just the summary text without any action tags
+                summary_text = ACTION_RE.sub('', summary).strip()
+
+                # Display the full results in the UI
+                display.add_conversation(result_text, speaker='marvin')
+
+                # Update history with full results
+                update_history(result_text, "")
+
+                # Speak the summarized version
+                ctx.say(summary_text)
+            else:
+                # Default message if we couldn't capture a result
+                display.add_conversation("Browser search complete, but couldn't extract specific results.", speaker='marvin')
+                update_history("Browser search complete, but couldn't extract specific results.", "")
+                ctx.say("Browser search complete, but I couldn't extract specific results.")
+        except Exception as e:
+            error_message = f"Error during browser search: {e}"
+            logger.error(error_message)
+            display.add_conversation(f"❌ {error_message}", speaker='marvin')
+            update_history(f"❌ {error_message}", "")
+            ctx.say("I encountered an error while browsing the internet.")
+    else:
+        ctx.say("No search query specified for browsing the internet.")
+        display.add_conversation("No search query specified for browsing the internet.", speaker='marvin')
+        update_history("No search query specified for browsing the internet.", "")
+
+async def _action_write_file(ctx, params, raw):
+    if len(params) >= 2:
+        filename = params[0]
+        content = params[1]
+        overwrite = True if len(params) <= 2 or params[2].lower() == 'true' else False
+        success = await ctx.file_ops.awrite_file(filename, content, overwrite)
+        if success:
+            ctx.say(f"Successfully wrote to file {filename}")
+        else:
+            ctx.say(f"Failed to write to file {filename}")
+    else:
+        ctx.say("Insufficient parameters for writing a file")
+
+async def _action_list_files(ctx, params, raw):
+    subdirectory = params[0] if params else ""
+    files = await ctx.file_ops.alist_files(subdirectory)
+    if files:
+        file_list = ", ".join(files[:10])
+        if len(files) > 10:
+            file_list += f", and {len(files) - 10} more files"
+        ctx.say(f"Found {len(files)} files: {file_list}")
+    else:
+        ctx.say(f"No files found in {'artifacts' if not subdirectory else subdirectory}")
+
+async def _action_delete_file(ctx, params, raw):
+    filename = params[0] if params else None
+    if filename:
+        success = await ctx.file_ops.adelete_file(filename)
+        if success:
+            ctx.say(f"Successfully deleted file {filename}")
+        else:
+            ctx.say(f"Failed to delete file {filename}")
+    else:
+        ctx.say("No filename specified for deletion")
+
+async def _action_edit_file(ctx, params, raw):
+    if len(params) >= 3:
+        filename = params[0]
+        find_text = params[1]
+        replace_text = params[2]
+        success = await ctx.file_ops.aedit_file(filename, find_text, replace_text)
+        if success:
+            ctx.say(f"Successfully edited file {filename}")
+        else:
+            ctx.say(f"Failed to edit file {filename}")
+    else:
+        ctx.say("Insufficient parameters for editing a file")
+
+async def _action_append_to_file(ctx, params, raw):
+    if len(params) >= 2:
+        filename = params[0]
+        content = params[1]
+        create_if_missing = True if len(params) <= 2 or params[2].lower() == 'true' else False
+        success = await ctx.file_ops.aappend_to_file(filename, content, create_if_missing)
+        if success:
+            ctx.say(f"Successfully appended to file {filename}")
+        else:
+            ctx.say(f"Failed to append to file {filename}")
+    else:
+        ctx.say("Insufficient parameters for appending to a file")
+
+async def _action_create_directory(ctx, params, raw):
+    directory = params[0] if params else None
+    if directory:
+        success = await ctx.file_ops.acreate_directory(directory)
+        if success:
+            ctx.say(f"Successfully created directory {directory}")
+        else:
+            ctx.say(f"Failed to create directory {directory}")
+    else:
+        ctx.say("No directory name specified for creation")
+
+async def _action_move_file(ctx, params, raw):
+    if len(params) >= 2:
+        source = params[0]
+        destination = params[1]
+        success = await ctx.file_ops.amove_file(source, destination)
+        if success:
+            ctx.say(f"Successfully moved file from {source} to {destination}")
+        else:
+            ctx.say(f"Failed to move file")
+    else:
+        ctx.say("Insufficient parameters for moving a file")
+
+async def _action_copy_file(ctx, params, raw):
+    if len(params) >= 2:
+        source = params[0]
+        destination = params[1]
+        success = await ctx.file_ops.acopy_file(source, destination)
+        if success:
+            ctx.say(f"Successfully copied file from {source} to {destination}")
+        else:
+            ctx.say(f"Failed to copy file")
+    else:
+        ctx.say("Insufficient parameters for copying a file")
+
+async def _action_search_files(ctx, params, raw):
+    if params:
+        search_text = params[0]
+        subdirectory = params[1] if len(params) > 1 else ""
+        # Only five names are read out, so a sixth match is enough to say "more"
+        matching_files = await ctx.file_ops.asearch_files(search_text, subdirectory, limit=6)
+        if matching_files:
+            file_list = ", ".join(matching_files[:5])
+            if len(matching_files) > 5:
+                file_list += ", and more"
+                ctx.say(f"Found at least 6 files containing '{search_text}': {file_list}")
+            else:
+                ctx.say(f"Found {len(matching_files)} files containing '{search_text}': {file_list}")
+        else:
+            ctx.say(f"No files containing '{search_text}' found")
+
+async def _action_get_time(ctx, params, raw):
+    time_text = get_time()
+    display.add_conversation(f"Marvin: {time_text}")
+    update_history(f"Marvin: {time_text}", "")
+    ctx.say(time_text)
+
+async def _action_dictate(ctx, params, raw):
+    dictated_text = raw
+    handle_dictate(dictated_text)
+
+async def _action_write_code(ctx, params, raw):
+    code = raw
+    if code:
+        logger.info("Detected action: write_code with code: %s", code)
+        display.add_conversation(f"Action: write_code with code: {code}")
+        update_history(f"Action: write_code with code: {code}", "")
+        handle_dictate(code)
+
+# Action handlers, looked up by exact action name.
+ACTION_HANDLERS = {
+    'turn_on_light': _action_turn_on_light,
+    'turn_off_light': _action_turn_off_light,
+    'play_song': _action_play_song,
+    'play_playlist': _action_play_playlist,
+    'pause_music': _action_pause_music,
+    'unpause_music': _action_unpause_music,
+    'stop_music': _action_stop_music,
+    'volume_up': _action_volume_up,
+    'volume_down': _action_volume_down,
+    'reboot': _action_reboot,
+    'set_timer': _action_set_timer,
+    'start_timer': _action_set_timer,
+    'stop_timer': _action_stop_timer,
+    'shut_down': _action_shut_down,
+    'read_file': _action_read_file,
+    'browse_internet': _action_browse_internet,
+    'write_file': _action_write_file,
+    'list_files': _action_list_files,
+    'delete_file': _action_delete_file,
+    'edit_file': _action_edit_file,
+    'append_to_file': _action_append_to_file,
+    'create_directory': _action_create_directory,
+    'move_file': _action_move_file,
+    'copy_file': _action_copy_file,
+    'search_files': _action_search_files,
+    'get_time': _action_get_time,
+    'dictate': _action_dictate,
+    'write_code': _action_write_code,
+}
+
+# Actions that must wait until the reply has been spoken, because they end or
+# replace the process.
+AFTER_SPEECH_ACTIONS = frozenset({'reboot', 'shut_down'})
+
+# Every action the model is told about should have a handler.
+_unhandled_actions = action_set - ACTION_HANDLERS.keys()
+if _unhandled_actions:
+    logger.warning("No handler for actions: %s", ', '.join(sorted(_unhandled_actions)))
+
+# Actions that only read state, so several in one reply can run concurrently.
+CONCURRENT_ACTIONS = frozenset({'read_file', 'list_files', 'search_files', 'get_time'})
+
+# Replies and utterances waiting between pipeline stages. Small, so a slow
+# stage pushes back on the one feeding it instead of piling up work.
+PIPELINE_QUEUE_SIZE = 2
+# Keep listening while Marvin talks. Off by default, since the microphone
+# would otherwise pick up Marvin's own voice.
+BARGE_IN = False
+
+# Seconds to wait before restarting a pipeline stage that crashed
+STAGE_RESTART_DELAY = 1.0
+
+async def _call_handler(ctx, action_name, handler, params, raw):
+    """Run one action handler; a failure is logged and reported out loud instead of raised."""
+    try:
+        await handler(ctx, params, raw)
+    except Exception as e:
+        logger.error("Error running action %s: %s", action_name, e, exc_info=True)
+        ctx.say(f"Sorry, I couldn't {action_name.replace('_', ' ')}.")
+
+async def _run_actions(ctx, actions):
+    """Dispatch the actions parsed from one reply."""
+    # Read-only actions queued since the last side-effecting one
+    pending = []
+    for action_name, params, raw in actions:
+        # Log the action
+        if params:
+            logger.info("Detected action: %s with params: %s", action_name, params)
+            display.add_conversation(f"Action: {action_name} with params: {params}")
+            update_history(f"Action: {action_name} with params: {params}", "")
+        else:
+            logger.info("Detected action: %s", action_name)
+            display.add_conversation(f"Action: {action_name}")
+            update_history(f"Action: {action_name}", "")
+        
+        # Dispatch to the handler for this action
+        handler = ACTION_HANDLERS.get(action_name)
+        if handler is None:
+            logger.warning("Action '%s' not recognized in the action list.", action_name)
+            display.add_conversation(f"Unknown action: {action_name}")
+            update_history(f"Unknown action: {action_name}", "")
+        elif action_name in CONCURRENT_ACTIONS:
+            pending.append(_call_handler(ctx, action_name, handler, params, raw))
+        else:
+            # Anything with side effects runs in order, after the
+            # reads that came before it
+            if pending:
+                await asyncio.gather(*pending)
+                pending = []
+            await _call_handler(ctx, action_name, handler, params, raw)
+    if pending:
+        await asyncio.gather(*pending)
+
+async def _listen(stt_executor, utterances, quiet):
+    """Pipeline stage 1: transcribe speech and queue commands that start with a wake word."""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Don't transcribe Marvin's own voice
+        if not BARGE_IN:
+            await quiet.wait()
+        
+        # Get user input from speech transcription.
+        try:
+            user_input = await loop.run_in_executor(stt_executor, transcribe_speech_to_text)
+        except TimeoutError:
+            logger.error("Error: Connection timed out while transcribing speech.")
+            continue
+        except Exception as e:
+            logger.error("An unexpected error occurred: %s", e)
+            continue
+
+        if not user_input:
+            continue
+        if not BARGE_IN and not quiet.is_set():
+            logger.debug("Ignoring speech heard while Marvin was talking: %s", user_input)
+            continue
+
+        # Process commands only if a valid wake word is detected.
+        wake_match = WAKE_RE.match(user_input)
+
+        if not wake_match:
+            logger.info("Waiting for wake word...")
+            continue
+
+        # Remove the detected wake word from the beginning of the input.
+        command = user_input[wake_match.end():].rstrip() or user_input
+        await utterances.put((user_input, command))
+
+async def _plan(utterances, replies):
+    """Pipeline stage 2: get the LLM reply for each command and split it into speech and actions."""
+    while True:
+        user_input, command = await utterances.get()
+
+        # Common commands are answered directly, without a round trip to the LLM
+        reply = match_intent(command)
+        if reply is None:
+            # Send only the command, so "hey marvin" vs "marvin" doesn't change the
+            # prompt. Get AI response without blocking the event loop.
+            reply = await get_ai_response_async(command)
+
+        # Update conversation history with the current turn.
+        display.add_conversation(user_input, speaker='user')
+        
+        # Most replies are plain chat; a substring test is much cheaper
+        # than running the action regex over them.
+        if '<action>' in reply.lower():
+            # Strip the action tags and collect them in one pass
+            text_to_speak, action_tags = split_actions(reply)
+            # Parse each tag once; dispatch and scheduling both use the result
+            actions = [parse_action(tag) for tag in action_tags]
+        else:
+            text_to_speak, actions = TAG_RE.sub('', reply).strip(), ()
+        display.add_conversation(text_to_speak, speaker='marvin')
+        
+        # Update the conversation history with what the model was actually sent
+        update_history(command, reply)
+
+        await replies.put((text_to_speak, actions))
+
+async def _speak(text, quiet):
+    logger.info("Marvin says: %s", text)
+    quiet.clear()
+    try:
+        await speak_text(text)
+    finally:
+        quiet.set()
+
+async def _respond(ctx, replies, quiet):
+    """Pipeline stage 3: speak each reply, then run its actions."""
+    while True:
+        text_to_speak, actions = await replies.get()
+
+        if not text_to_speak:
+            await _run_actions(ctx, actions)
+        elif not actions or any(name in AFTER_SPEECH_ACTIONS for name, _, _ in actions):
+            await _speak(text_to_speak, quiet)
+            await _run_actions(ctx, actions)
+        else:
+            # Run the actions while the reply is being spoken; anything they
+            # want to say is buffered and spoken afterwards. A failure in one
+            # must not cancel the other, so speech and actions both finish.
+            results = await asyncio.gather(
+                _speak(text_to_speak, quiet), _run_actions(ctx, actions), return_exceptions=True
+            )
+            for stage, result in zip(('speech', 'actions'), results):
+                if isinstance(result, Exception):
+                    logger.error("Error during reply %s: %s", stage, result, exc_info=result)
+        # Everything the actions had to say goes out as one utterance
+        if ctx.say_buffer:
+            action_text = " ".join(ctx.say_buffer)
+            ctx.say_buffer.clear()
+            await _speak(action_text, quiet)
+        if ctx.exit_requested:
+            request_exit()
+
+async def _supervise(name, make_stage):
+    """Run a pipeline stage, logging and restarting it if it crashes."""
+    while True:
+        try:
+            await make_stage()
+            return
+        except Exception as e:
+            logger.error("Pipeline stage %s crashed, restarting: %s", name, e, exc_info=True)
+            await asyncio.sleep(STAGE_RESTART_DELAY)
 
 async def async_main():
     logger.debug("System prompt: %s", system_prompt)
     logger.debug("Initializing Meross Controller...")
     meross_controller = await MerossController.init()
-    spotify_client = SpotifyClient()
     
     # Initialize the file operations manager
-    file_ops = FileOperations()
+    file_ops = _get_file_ops()
     logger.debug("File operations initialized with artifacts directory: %s", file_ops.artifacts_dir)
     
+    ctx = ActionContext(meross_controller, file_ops)
+    
+    # A fresh OpenAI client per session, since its connections are tied to this loop
+    open_async_client()
+    
+    # One long-lived worker for speech recognition instead of a default-pool
+    # thread per utterance; shut down with the loop below
+    stt_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stt')
+    
     try:
         await speak_text("Marvin online")
         
-        while True:
-            # Get user input from speech transcription.
-            try:
-                user_input = await asyncio.to_thread(transcribe_speech_to_text)
-            except TimeoutError:
-                logger.error("Error: Connection timed out while transcribing speech.")
-                continue
-            except Exception as e:
-                logger.error(f"An unexpected error occurred: {e}")
-                continue
-
-            if not user_input:
-                continue
-
-            # Process commands only if a valid wake word is detected.
-            wake_words = ["marvin", "hey marvin", "ok marvin", "okay marvin", "hi marvin"]
-            wake_words += ["martin", "hey martin", "ok martin", "okay martin", "hi martin"]
-            wake_words += ["computer", "hey computer", "ok computer", "okay computer", "hi computer"]
-            wake_words += ["PC", "hey PC", "ok PC", "okay PC", "hi PC"]
-            user_input_lower = user_input.lower()
-            matched_wake_word = None
-            for wake_word in wake_words:
-                if user_input_lower.startswith(wake_word):
-                    matched_wake_word = wake_word
-                    break
-
-            if not matched_wake_word:
-                logger.info("Waiting for wake word...")
-                continue
-
-            # Remove the detected wake word from the beginning of the input.
-            command = user_input[len(matched_wake_word):].strip()
-
-            # Get AI response using a thread since it may block.
-            reply = await asyncio.to_thread(get_ai_response, user_input)
-
-            # Update conversation history with the current turn.
-            display.add_conversation(user_input, speaker='user')
-            
-            # Strip out action tags for display
-            display_reply = re.sub(r'<action>.*?</action>', '', reply, flags=re.IGNORECASE)
-            display.add_conversation(display_reply, speaker='marvin')
-            
-            # Update the conversation history
-            update_history(user_input, reply)
-
-            # Remove any <action> tags from the text before speaking.
-            text_to_speak = re.sub(r'<action>.*?</action>', '', reply, flags=re.IGNORECASE)
-            text_to_speak = re.sub(r'<[^>]+>', '', text_to_speak).strip()
-
-            if text_to_speak:
-                logger.info(f"Marvin says: {text_to_speak}")
-                await speak_text(text_to_speak)
-
-            # Parse the AI reply for <action> tags to trigger actions.
-            action_tags = re.findall(r'<action>(.*?)</action>', reply, flags=re.IGNORECASE)
-            for action in action_tags:
-                normalized_action = action.lower().replace(" ", "_")
-                
-                # Extract parameters if they exist (format: action_name:param1,param2)
-                params = []
-                if ':' in normalized_action:
-                    action_parts = normalized_action.split(':', 1)
-                    action_name = action_parts[0]
-                    params_text = action_parts[1]
-                    
-                    # Handle comma-separated parameters
-                    if ',' in params_text:
-                        params = [param.strip() for param in params_text.split(',')]
-                    else:
-                        params = [params_text.strip()]
-                else:
-                    action_name = normalized_action
-                
-                # Log the action
-                if params:
-                    logger.info(f"Detected action: {action_name} with params: {params}")
-                    display.add_conversation(f"Action: {action_name} with params: {params}")
-                    update_history(f"Action: {action_name} with params: {params}", "")
-                else:
-                    logger.info(f"Detected action: {action_name}")
-                    display.add_conversation(f"Action: {action_name}")
-                    update_history(f"Action: {action_name}", "")
-                
-                # Handle existing actions
-                if action_name.startswith("turn_on_light"):
-                    await meross_controller.turn_on_light()
-                elif action_name.startswith("turn_off_light"):
-                    await meross_controller.turn_off_light()
-                elif action_name.startswith("play_song"):
-                    song_name = params[0] if params else ''
-                    if song_name:
-                        spotify_client.play_track(song_name)
-                elif action_name.startswith("play_playlist"):
-                    playlist_name = params[0] if params else ''
-                    if playlist_name:
-                        spotify_client.play_playlist(playlist_name)
-                elif action_name.startswith("pause_music"):
-                    spotify_client.pause_music()
-                elif action_name.startswith("unpause_music"):
-                    spotify_client.unpause_music()
-                elif action_name.startswith("stop_music"):
-                    spotify_client.stop_music()
-                elif action_name.startswith("volume_up"):
-                    increment = int(params[0]) if params and params[0].isdigit() else 10
-                    spotify_client.volume_up(increment)
-                elif action_name.startswith("volume_down"):
-                    decrement = int(params[0]) if params and params[0].isdigit() else 10
-                    spotify_client.volume_down(decrement)
-                elif action_name.startswith("reboot"):
-                    logger.info("Rebooting Marvin...")
-                    bat_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "run_marvin.bat"))
-                    logger.info(f"Running batch file: {bat_path}")
-                    subprocess.Popen([bat_path], shell=True, creationflags=subprocess.CREATE_NEW_CONSOLE)
-                    os._exit(0)
-                elif action_name.startswith('set_timer') or action_name.startswith('start_timer'):
-                    duration = params[0] if params else ''
-                    if duration:
-                        # Replace underscores with spaces if present
-                        duration = duration.replace('_', ' ')
-                        logger.info(f"Setting timer with cleaned duration: '{duration}'")
-                        asyncio.create_task(set_timer(duration))
-                elif action_name.startswith('stop_timer'):
-                    await stop_timer()
-                elif action_name.startswith('shut_down'):
-                    await speak_text('Shutting down Marvin')
-                    logger.info('Shutting down Marvin...')
-                    # Ensure Meross controller is properly shut down
-                    await meross_controller.shutdown()
-                    stop_assistant()
-                    os._exit(0)
-                    
-                # New file operation actions
-                elif action_name.startswith('read_file'):
-                    filename = params[0] if params else None
-                    if filename:
-                        content = file_ops.read_file(filename)
-                        if content is not None:
-                            # Create a temporary file with the content to be read back
-                            temp_file = os.path.join(file_ops.artifacts_dir, "_temp_read.txt")
-                            with open(temp_file, 'w', encoding='utf-8') as f:
-                                f.write(f"Content of file {filename}:\n{content}")
-                            # Read the content out loud with a limit
-                            preview = content[:300] + "..." if len(content) > 300 else content
-                            await speak_text(f"Content of file {filename}: {preview}")
-                        else:
-                            await speak_text(f"Could not read file {filename}")
-                    else:
-                        await speak_text("No filename specified for reading")
-                
-                # Browser use action
-                elif action_name.startswith('browse_internet'):
-                    query = params[0] if params else None
-                    if query:
-                        display.add_conversation(f"Browsing the internet for: {query}", speaker='marvin')
-                        update_history(f"Browsing the internet for: {query}", "")
-                        try:
-                            # Set up a custom log handler to capture the browser_use agent's output
-                            class BrowserUseLogHandler(logging.Handler):
-                                def __init__(self):
-                                    super().__init__()
-                                    self.result = None
-                                
-                                def emit(self, record):
-                                    if record.name == 'browser_use.agent.service' and 'Result:' in record.getMessage():
-                                        # Extract the result from the log message
-                                        result_msg = record.getMessage()
-                                        if '\U0001f4c4 Result:' in result_msg:
-                                            self.result = result_msg.split('\U0001f4c4 Result:')[1].strip()
-                                        elif 'Result:' in result_msg:
-                                            self.result = result_msg.split('Result:')[1].strip()
-                            
-                            # Add the custom log handler
-                            browser_log_handler = BrowserUseLogHandler()
-                            browser_log_handler.setLevel(logging.INFO)
-                            logging.getLogger('browser_use').addHandler(browser_log_handler)
-                            
-                            # Create and run the browser agent
-                            await browser.close()
-                            agent = Agent(
-                                task=query,
-                                llm=ChatOpenAI(model="gpt-4o"),
-                                browser=browser,
-                            )
-                            await agent.run()
-                            
-                            # Remove the custom log handler
-                            logging.getLogger('browser_use').removeHandler(browser_log_handler)
-                            
-                            # Check if we captured a result
-                            if browser_log_handler.result:
-                                result_text = browser_log_handler.result
-                                
-                                # Send the result to the LLM for summarization
-                                summarization_prompt = f"Below are the results from a web search. Please provide a concise summary of these results, while preserving the key information:\n\n{result_text}"
-                                summary = get_ai_response(summarization_prompt)
-                                
-                                # Extract just the summary text without any action tags
-                                summary_text = re.sub(r'<action>.*?</action>', '', summary).strip()
-                                
-                                # Display the full results in the UI
-                                display.add_conversation(result_text, speaker='marvin')
-                                
-                                # Update history with full results
-                                update_history(result_text, "")
-                                
-                                # Speak the summarized version
-                                await speak_text(summary_text)
-                            else:
-                                # Default message if we couldn't capture a result
-                                display.add_conversation("Browser search complete, but couldn't extract specific results.", speaker='marvin')
-                                update_history("Browser search complete, but couldn't extract specific results.", "")
-                                await speak_text("Browser search complete, but I couldn't extract specific results.")
-                        except Exception as e:
-                            error_message = f"Error during browser search: {e}"
-                            logger.error(error_message)
-                            display.add_conversation(f"❌ {error_message}", speaker='marvin')
-                            update_history(f"❌ {error_message}", "")
-                            await speak_text("I encountered an error while browsing the internet.")
-                    else:
-                        await speak_text("No search query specified for browsing the internet.")
-                        display.add_conversation("No search query specified for browsing the internet.", speaker='marvin')
-                        update_history("No search query specified for browsing the internet.", "")
-                        
-                elif action_name.startswith('write_file'):
-                    if len(params) >= 2:
-                        filename = params[0]
-                        content = params[1]
-                        overwrite = True if len(params) <= 2 or params[2].lower() == 'true' else False
-                        success = file_ops.write_file(filename, content, overwrite)
-                        if success:
-                            await speak_text(f"Successfully wrote to file {filename}")
-                        else:
-                            await speak_text(f"Failed to write to file {filename}")
-                    else:
-                        await speak_text("Insufficient parameters for writing a file")
-                        
-                elif action_name.startswith('list_files'):
-                    subdirectory = params[0] if params else ""
-                    files = file_ops.list_files(subdirectory)
-                    if files:
-                        file_list = ", ".join(files[:10])
-                        if len(files) > 10:
-                            file_list += f", and {len(files) - 10} more files"
-                        await speak_text(f"Found {len(files)} files: {file_list}")
-                    else:
-                        await speak_text(f"No files found in {'artifacts' if not subdirectory else subdirectory}")
-                        
-                elif action_name.startswith('delete_file'):
-                    filename = params[0] if params else None
-                    if filename:
-                        success = file_ops.delete_file(filename)
-                        if success:
-                            await speak_text(f"Successfully deleted file {filename}")
-                        else:
-                            await speak_text(f"Failed to delete file {filename}")
-                    else:
-                        await speak_text("No filename specified for deletion")
-                        
-                elif action_name.startswith('edit_file'):
-                    if len(params) >= 3:
-                        filename = params[0]
-                        find_text = params[1]
-                        replace_text = params[2]
-                        success = file_ops.edit_file(filename, find_text, replace_text)
-                        if success:
-                            await speak_text(f"Successfully edited file {filename}")
-                        else:
-                            await speak_text(f"Failed to edit file {filename}")
-                    else:
-                        await speak_text("Insufficient parameters for editing a file")
-                        
-                elif action_name.startswith('append_to_file'):
-                    if len(params) >= 2:
-                        filename = params[0]
-                        content = params[1]
-                        create_if_missing = True if len(params) <= 2 or params[2].lower() == 'true' else False
-                        success = file_ops.append_to_file(filename, content, create_if_missing)
-                        if success:
-                            await speak_text(f"Successfully appended to file {filename}")
-                        else:
-                            await speak_text(f"Failed to append to file {filename}")
-                    else:
-                        await speak_text("Insufficient parameters for appending to a file")
-                        
-                elif action_name.startswith('create_directory'):
-                    directory = params[0] if params else None
-                    if directory:
-                        success = file_ops.create_directory(directory)
-                        if success:
-                            await speak_text(f"Successfully created directory {directory}")
-                        else:
-                            await speak_text(f"Failed to create directory {directory}")
-                    else:
-                        await speak_text("No directory name specified for creation")
-                        
-                elif action_name.startswith('move_file'):
-                    if len(params) >= 2:
-                        source = params[0]
-                        destination = params[1]
-                        success = file_ops.move_file(source, destination)
-                        if success:
-                            await speak_text(f"Successfully moved file from {source} to {destination}")
-                        else:
-                            await speak_text(f"Failed to move file")
-                    else:
-                        await speak_text("Insufficient parameters for moving a file")
-                        
-                elif action_name.startswith('copy_file'):
-                    if len(params) >= 2:
-                        source = params[0]
-                        destination = params[1]
-                        success = file_ops.copy_file(source, destination)
-                        if success:
-                            await speak_text(f"Successfully copied file from {source} to {destination}")
-                        else:
-                            await speak_text(f"Failed to copy file")
-                    else:
-                        await speak_text("Insufficient parameters for copying a file")
-                        
-                elif action_name.startswith('search_files'):
-                    if params:
-                        search_text = params[0]
-                        subdirectory = params[1] if len(params) > 1 else ""
-                        matching_files = file_ops.search_files(search_text, subdirectory)
-                        if matching_files:
-                            file_list = ", ".join(matching_files[:5])
-                            if len(matching_files) > 5:
-                                file_list += f", and {len(matching_files) - 5} more"
-                            await speak_text(f"Found {len(matching_files)} files containing '{search_text}': {file_list}")
-                        else:
-                            await speak_text(f"No files containing '{search_text}' found")
-                elif action_name.startswith('get_time'):
-                    time_text = get_time()
-                    display.add_conversation(f"Marvin: {time_text}")
-                    update_history(f"Marvin: {time_text}", "")
-                    await speak_text(time_text)
-                elif action_name.startswith('dictate'):
-                    dictated_text = action[len("dictate"):].strip()
-                    handle_dictate(dictated_text)
-                elif action_name.startswith('write_code'):
-                    code = action[len('write_code'):].strip()
-                    if code:
-                        logger.info(f"Detected action: write_code with code: {code}")
-                        display.add_conversation(f"Action: write_code with code: {code}")
-                        update_history(f"Action: write_code with code: {code}", "")
-                        handle_dictate(code)
-                else:
-                    logger.warning(f"Action '{normalized_action}' not recognized in the action list.")
-                    display.add_conversation(f"Unknown action: {action_name}")
-                    update_history(f"Unknown action: {action_name}", "")
-
-        # if text_to_speak:
-        #     logging.info(f"Marvin says: {text_to_speak}")
-        #     await speak_text(text_to_speak)
+        # Listening, thinking and speaking run as separate stages, so the next
+        # command can be heard while the previous one's actions are still running.
+        utterances = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        replies = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        # Set whenever Marvin is not speaking
+        quiet = asyncio.Event()
+        quiet.set()
+        ctx.replies = replies
+        # A stage that raises is logged and restarted rather than leaving the
+        # others waiting on a queue nobody serves
+        stages = [
+            asyncio.create_task(_supervise('listen', lambda: _listen(stt_executor, utterances, quiet))),
+            asyncio.create_task(_supervise('plan', lambda: _plan(utterances, replies))),
+            asyncio.create_task(_supervise('respond', lambda: _respond(ctx, replies, quiet))),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
     finally:
+        # Don't wait for a listen that is still in progress
+        stt_executor.shutdown(wait=False, cancel_futures=True)
+        await close_async_client()
         # Ensure Meross controller is properly shut down even if an exception occurs
         if 'meross_controller' in locals():
             logger.info("Shutting down Meross controller...")
-            await meross_controller.shutdown()
+            await meross_controller.close()
 
-async def set_timer(duration: str):
-    global timer_counter
+async def set_timer(ctx, duration: str):
     try:
-        logger.debug(f"Setting timer with duration: '{duration}'")
-        
-        # First, check if the duration is already in the format "X unit"
-        duration_parts = duration.split()
-        logger.debug(f"Duration parts: {duration_parts}")
+        logger.debug("Setting timer with duration: '%s'", duration)
         
-        if len(duration_parts) == 2:
-            # Format is already "X unit"
-            try:
-                value = int(duration_parts[0])
-                unit_input = duration_parts[1].lower()
-                logger.debug(f"Parsed as two parts: value={value}, unit={unit_input}")
-            except ValueError as e:
-                logger.error(f"Error parsing value: {e}")
-                await speak_text('Invalid timer format. The value must be a number.')
-                return
+        # Sum every "<number> <unit>" part, so "1h30m" and "1 hour 30 minutes" both work
+        duration_parts = DURATION_RE.findall(duration)
+        if duration_parts:
+            seconds_value = sum(int(value) * DURATION_UNITS[unit.lower()] for value, unit in duration_parts)
+        elif duration.strip().isdigit():
+            # A bare number is taken as seconds
+            seconds_value = int(duration)
         else:
-            # Try to parse the duration as a single value
-            # Check if it's just a number (assume seconds)
-            try:
-                value = int(duration)
-                unit_input = 'seconds'
-                logger.debug(f"Parsed as single number: {value} {unit_input}")
-            except ValueError:
-                # Try to extract number and unit from a string without spaces
-                import re
-                match = re.match(r'(\d+)(\w+)', duration)
-                if match:
-                    try:
-                        value = int(match.group(1))
-                        unit_abbr = match.group(2).lower()
-                        unit_input = unit_abbr
-                        logger.debug(f"Parsed with regex: value={value}, unit={unit_input}")
-                    except ValueError as e:
-                        logger.error(f"Error parsing regex match: {e}")
-                        await speak_text('Invalid timer format. Use format like "5 minutes" or "5m".')
-                        return
-                else:
-                    logger.error(f"Could not parse timer format: '{duration}'")
-                    await speak_text('Invalid timer format. Use format like "5 minutes" or "5m".')
-                    return
-        
-        # Map any unit format to a standardized format
-        unit_map = {
-            's': 'second', 'sec': 'second', 'second': 'second', 'seconds': 'second',
-            'm': 'minute', 'min': 'minute', 'minute': 'minute', 'minutes': 'minute',
-            'h': 'hour', 'hr': 'hour', 'hour': 'hour', 'hours': 'hour'
-        }
-        
-        # Try to map the input unit to a standard unit
-        if unit_input in unit_map:
-            unit = unit_map[unit_input]
-            logger.debug(f"Mapped '{unit_input}' to '{unit}'")
-        else:
-            logger.error(f"Unknown time unit: '{unit_input}'")
-            await speak_text(f'Invalid time unit: "{unit_input}". Use seconds, minutes, or hours.')
+            logger.error("Could not parse timer format: '%s'", duration)
+            ctx.say('Invalid timer format. Use format like "5 minutes" or "5m".')
             return
-            
-        # Check if unit is valid (should always be valid after mapping)
-        valid_units = ['second', 'minute', 'hour']
-        if unit in valid_units:
-            # Convert to seconds
-            if unit == 'minute':
-                seconds_value = value * 60
-            elif unit == 'hour':
-                seconds_value = value * 3600
-            else:  # seconds
-                seconds_value = value
-                
-            # For display purposes, use the original format
-            display_unit = unit + ('s' if value != 1 else '')
-            
-            logger.debug(f"Setting timer for {value} {display_unit} ({seconds_value} seconds)")
-            timer_name = f"timer_{timer_counter}"
-            timer_counter += 1
-            display.add_timer(timer_name, timedelta(seconds=seconds_value))
-            await asyncio.sleep(seconds_value)
-            display.remove_timer(timer_name)
-            await speak_text('Timer complete!')
-        else:
-            # This should never happen with our mapping
-            logger.error(f"Unexpected error: Unit '{unit}' not in valid_units after mapping")
-            await speak_text('Invalid time unit. Use seconds, minutes, or hours.')
+        
+        logger.debug("Setting timer for %d seconds", seconds_value)
+        with _STATE_LOCK:
+            timer_name = f"timer_{STATE.timer_counter}"
+            STATE.timer_counter += 1
+        display.add_timer(timer_name, timedelta(seconds=seconds_value))
+        # A scheduled callback rather than a sleeping task, so nothing is kept
+        # alive while the timer runs and stop_timer can cancel it
+        loop = asyncio.get_running_loop()
+        timer_handles[timer_name] = loop.call_later(seconds_value, _fire_timer, ctx, timer_name)
     except Exception as e:
-        logger.error(f'Error setting timer: {e}', exc_info=True)
-        await speak_text('Error setting timer.')
+        logger.error('Error setting timer: %s', e, exc_info=True)
+        ctx.say('Error setting timer.')
+
+def _fire_timer(ctx, timer_name):
+    timer_handles.pop(timer_name, None)
+    display.remove_timer(timer_name)
+    # Spoken by the respond stage, after any reply in progress
+    task = asyncio.ensure_future(ctx.replies.put(('Timer complete!', ())))
+    # The loop only keeps a weak reference to tasks
+    _timer_tasks.add(task)
+    task.add_done_callback(_timer_tasks.discard)
 
 async def stop_timer():
-    # Stop all active timers by removing each one from the display
-    active_timers = list(display.timers.keys())
-    for tname in active_timers:
+    # Cancel every pending timer and remove it from the display
+    for tname, handle in list(timer_handles.items()):
+        handle.cancel()
         display.remove_timer(tname)
+    timer_handles.clear()
     logger.info('All timers stopped')
 
-# Global variable to track the running event loop
-assistant_loop = None
-assistant_task = None
+# Seconds stop_assistant waits for the assistant to wind down
+STOP_TIMEOUT = 5.0
+
+async def _shutdown():
+    """Cancel every other task on the assistant's loop and wait for them to finish."""
+    current = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # async_main closes Meross on its way out; this covers a controller it never got to
+    await shutdown_meross()
 
-async def stop_assistant():
-    """Stop the assistant and clean up resources."""
-    global assistant_loop, assistant_task
+def stop_assistant():
+    """Stop the assistant and clean up resources. Safe to call from any thread."""
+    with _STATE_LOCK:
+        assistant_loop, assistant_thread = STATE.loop, STATE.thread
+    
+    if assistant_loop is None or assistant_loop.is_closed():
+        logger.info("Assistant is not running")
+        return
     
     logger.info("Stopping assistant...")
     
     try:
-        # Cancel the assistant task if it's running
-        if assistant_task and not assistant_task.done():
-            assistant_task.cancel()
-            try:
-                # Wait for the task to be cancelled
-                await asyncio.wait_for(assistant_task, timeout=5.0)
-            except asyncio.TimeoutError:
-                logger.error("Timeout waiting for assistant task to cancel")
-            except asyncio.CancelledError:
-                logger.debug("Assistant task cancelled successfully")
-            except Exception as e:
-                logger.error(f"Error cancelling assistant task: {e}")
-        
-        # Clean up the event loop
-        if assistant_loop and assistant_loop.is_running():
-            # Schedule a callback to stop the loop
-            assistant_loop.call_soon_threadsafe(assistant_loop.stop)
-            
-            # Wait for the loop to stop (with timeout)
-            start_time = time.time()
-            while assistant_loop.is_running() and time.time() - start_time < 5.0:
-                time.sleep(0.1)
-                
-            if assistant_loop.is_running():
-                logger.warning("Event loop is still running after timeout")
-        
-        # Shutdown the Meross controller
-        await shutdown_meross()
-        
-        # Properly shut down all loggers
-        shutdown_logging()
-        
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is assistant_loop:
+        # Called from an action on the assistant's own loop, which can't block
+        # waiting for itself; the shutdown runs once the caller yields
+        assistant_loop.create_task(_shutdown())
+        return
+    
+    try:
+        # Runs on the assistant's loop; returns as soon as cleanup is done
+        future = asyncio.run_coroutine_threadsafe(_shutdown(), assistant_loop)
+        try:
+            future.result(timeout=STOP_TIMEOUT)
+        except concurrent.futures.CancelledError:
+            # The loop finished first and cancelled the leftover shutdown coroutine
+            pass
+        # Wait for the runner to close the loop, so a following start or exit
+        # doesn't race the teardown
+        if assistant_thread is not None and assistant_thread is not threading.current_thread():
+            assistant_thread.join(timeout=STOP_TIMEOUT)
+            if assistant_thread.is_alive():
+                logger.warning("Assistant thread is still running after timeout")
         logger.info("Assistant stopped successfully")
+    except concurrent.futures.TimeoutError:
+        logger.error("Timeout waiting for assistant to stop")
     except Exception as e:
-        logger.error(f"Error stopping assistant: {e}")
+        logger.error("Error stopping assistant: %s", e)
 
 # Helper function to shut down Meross controller
 async def shutdown_meross():
@@ -593,50 +875,136 @@ async def shutdown_meross():
             await controller.close()
             logger.debug("Meross controller shut down successfully")
     except Exception as e:
-        logger.error(f"Error shutting down Meross controller: {e}")
+        logger.error("Error shutting down Meross controller: %s", e)
     
+# pystray and PIL are only needed by the tray thread, so they are imported on
+# first use instead of on the startup path
+@lru_cache(maxsize=1)
+def _pystray():
+    import pystray
+    return pystray
+
+@lru_cache(maxsize=1)
+def _pil_image():
+    from PIL import Image
+    return Image
+
+@lru_cache(maxsize=1)
+def _tray_icon():
+    """Decoded tray icon, read from disk once per process and reused on every restart."""
+    # Image.open is lazy and would otherwise decode on first draw
+    image = _pil_image().open(_ICON_PATH)
+    image.load()
+    return image.convert('RGBA')
+
 # Function to create system tray icon
 def create_system_tray():
-    image = Image.open('icon.png')
+    pystray = _pystray()
     
     def on_exit(icon):
         logger.info('Exiting Marvin from system tray...')
-        stop_assistant()
         icon.stop()
-        os._exit(0)  # Force terminate the process
+        request_exit()
     
     menu = (
-        pystray.MenuItem('Start', lambda: start_assistant()),
+        pystray.MenuItem('Start', lambda: start_assistant_thread()),
         pystray.MenuItem('Stop', lambda: stop_assistant()),
         pystray.MenuItem('Exit', on_exit)
     )
-    icon = pystray.Icon('Marvin', image, 'Marvin Voice Assistant', menu)
+    icon = pystray.Icon('Marvin', _tray_icon(), 'Marvin Voice Assistant', menu)
     icon.run()
 
+async def _run_assistant():
+    # Publish the loop and task so the tray thread can stop them
+    with _STATE_LOCK:
+        STATE.loop = asyncio.get_running_loop()
+        STATE.task = asyncio.current_task()
+    await async_main()
+
 def start_assistant():
-    global assistant_loop, assistant_task
-    
-    if assistant_loop is not None:
-        logger.info('Assistant is already running')
-        return
-    
-    # Start the system tray in a separate thread
-    tray_thread = threading.Thread(target=create_system_tray, daemon=True)
-    tray_thread.start()
+    # Check and claim the assistant in one step so two starts can't both run
+    with _STATE_LOCK:
+        if STATE.running:
+            logger.info('Assistant is already running')
+            return
+        STATE.running = True
+        STATE.thread = threading.current_thread()
     
     logger.info('Starting assistant...')
-    assistant_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(assistant_loop)
-    assistant_task = assistant_loop.create_task(async_main())
-    assistant_loop.run_until_complete(assistant_task)
+    loop_factory = _fast_loop.new_event_loop if _fast_loop is not None else None
+    try:
+        # The runner owns the loop: it cancels leftover tasks and shuts down
+        # async generators and the default executor on the way out
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(_run_assistant())
+    except asyncio.CancelledError:
+        logger.info('Assistant task cancelled')
+    finally:
+        with _STATE_LOCK:
+            STATE.running = False
+            STATE.thread = None
+            STATE.loop = None
+            STATE.task = None
+
+def _warm_up():
+    """Load the slow imports and models in the background so the first use doesn't wait."""
+    try:
+        _tray_icon()
+        _pystray()
+        preload_whisper_model()
+    except Exception as e:
+        logger.error("Error during warm-up: %s", e)
+
+def request_exit(restart=False):
+    """
+    Ask the process to exit, or to restart when restart is True. Safe to call
+    from any thread: the display closes, and main() then stops the assistant
+    cleanly, closing the Meross session, before the process goes away.
+    """
+    with _STATE_LOCK:
+        STATE.restart = restart
+    display.quit()
+
+def _exit_process():
+    """Exit, or start this script again if a restart was requested."""
+    with _STATE_LOCK:
+        restart = STATE.restart
+    # Start this script again in the same interpreter. run_marvin.bat only
+    # launches main.py with pythonw, so going through cmd.exe and the batch
+    # file would add nothing but a shell start-up.
+    args = [sys.executable, _MAIN_PATH, *sys.argv[1:]]
+    if restart:
+        logger.info("Restarting with: %s", args)
+    # Neither exit path runs atexit handlers, so write out pending history, cache and logs first
+    flush_history()
+    flush_cache()
+    shutdown_logging()
+    if restart:
+        if os.name == 'nt':
+            # Windows exec joins the arguments into one command line without quoting them
+            args = [f'"{arg}"' if ' ' in arg else arg for arg in args]
+        os.execv(sys.executable, args)
+    # A normal exit would wait for worker threads still blocked on the microphone
+    os._exit(0)
+
+def start_assistant_thread():
+    """Run the assistant on its own thread, which owns its event loop for its whole life."""
+    threading.Thread(target=start_assistant, name='assistant', daemon=True).start()
 
 def main():
-    # Create a thread for the assistant
-    assistant_thread = threading.Thread(target=start_assistant, daemon=True)
-    assistant_thread.start()
+    threading.Thread(target=_warm_up, name='warmup', daemon=True).start()
+    
+    # One tray icon for the life of the process; Start and Stop reuse it
+    threading.Thread(target=create_system_tray, name='tray', daemon=True).start()
     
-    # Run the display GUI in the main thread
+    start_assistant_thread()
+    
+    # Run the display GUI in the main thread; it returns once an exit is requested
     display.run()
+    
+    # Cancel the pipeline and close Meross before leaving
+    stop_assistant()
+    _exit_process()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
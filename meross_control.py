@@ -7,6 +7,8 @@ and offering action functions for turning lights on or off.
 
 import os
 import asyncio
+import logging
+import time
 from logger_config import get_logger
 from meross_iot.http_api import MerossHttpClient
 from meross_iot.manager import MerossManager
@@ -14,6 +16,9 @@ from meross_iot.manager import MerossManager
 # Get a logger for this module
 logger = get_logger(__name__)
 
+# Seconds a polled device state is trusted, so back-to-back commands don't re-poll
+UPDATE_TTL = 5.0
+
 class MerossController:
     _instance = None
     
@@ -21,6 +26,8 @@ class MerossController:
         self.http_api_client = http_api_client
         self.manager = manager
         self.devices = devices
+        # Last time each device's state was polled, by uuid
+        self._updated_at = {}
         # Store the instance for singleton access
         MerossController._instance = self
 
@@ -47,27 +54,46 @@ class MerossController:
         devices = manager.find_devices()
         if not devices:
             logger.warning("No devices found...")
-        else:
+        elif logger.isEnabledFor(logging.INFO):
             logger.info("Discovered devices: %s", [dev.name for dev in devices])
         return cls(http_api_client, manager, devices)
 
+    async def _refresh(self, dev):
+        """Poll the device state unless it was polled within UPDATE_TTL seconds."""
+        now = time.monotonic()
+        if now - self._updated_at.get(dev.uuid, float('-inf')) >= UPDATE_TTL:
+            await dev.async_update()
+            self._updated_at[dev.uuid] = now
+
+    async def _toggle(self, dev, on):
+        await self._refresh(dev)
+        logger.info("Turning %s %s...", "on" if on else "off", dev.name)
+        if on:
+            await dev.async_turn_on(channel=0)
+        else:
+            await dev.async_turn_off(channel=0)
+
+    async def _toggle_all(self, on):
+        # Talk to every device at once instead of one round trip after another
+        results = await asyncio.gather(
+            *(self._toggle(dev, on) for dev in self.devices),
+            return_exceptions=True
+        )
+        for dev, result in zip(self.devices, results):
+            if isinstance(result, Exception):
+                logger.error("Error turning %s %s: %s", "on" if on else "off", dev.name, result)
+
     async def turn_on_light(self):
         if not self.devices:
             logger.warning("No devices available to turn on.")
             return
-        for dev in self.devices:
-            await dev.async_update()
-            logger.info("Turning on %s...", dev.name)
-            await dev.async_turn_on(channel=0)
+        await self._toggle_all(True)
 
     async def turn_off_light(self):
         if not self.devices:
             logger.warning("No devices available to turn off.")
             return
-        for dev in self.devices:
-            await dev.async_update()
-            logger.info("Turning off %s...", dev.name)
-            await dev.async_turn_off(channel=0)
+        await self._toggle_all(False)
 
     async def close(self):
         """Properly close the manager and client connections."""
@@ -84,7 +110,7 @@ class MerossController:
             # Clear the singleton instance
             MerossController._instance = None
         except Exception as e:
-            logger.error(f"Error closing Meross connections: {e}")
+            logger.error("Error closing Meross connections: %s", e)
         
     # Keep the old method name for backward compatibility
     async def shutdown(self):
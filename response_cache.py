@@ -0,0 +1,333 @@
+"""
+response_cache.py - Remembers LLM replies to repeated commands.
+A command like "turn off the light" always gets the same kind of reply, so a
+repeat can be answered from memory instead of another round trip to the API.
+Exact repeats are looked up by text; paraphrases ("lights off please") are
+matched by sentence embeddings when sentence-transformers is installed, but
+only for replies whose actions are harmless and whose parameters all appear
+in the new command.
+Commands that refer back to earlier turns ("do that again") are never cached,
+so every cached reply stands on its own. Both tiers are saved to disk shortly
+after a change, so a restart begins with a warm cache.
+"""
+
+import atexit
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from logger_config import get_logger
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# Get a logger for this module
+logger = get_logger(__name__)
+
+# Number of distinct commands remembered before the oldest is dropped.
+EXACT_CACHE_SIZE = 256
+# Small local embedding model used to match paraphrased commands.
+SEMANTIC_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+SEMANTIC_CACHE_SIZE = 512
+# Minimum cosine similarity for a paraphrase to reuse a cached reply.
+SIMILARITY_THRESHOLD = 0.92
+
+# Where the cache is kept between runs
+CACHE_DIR = Path(__file__).resolve().parent / 'cache'
+EXACT_CACHE_FILE = CACHE_DIR / 'responses.json'
+SEMANTIC_VECTORS_FILE = CACHE_DIR / 'semantic_vectors.npy'
+SEMANTIC_REPLIES_FILE = CACHE_DIR / 'semantic_replies.json'
+# Seconds to wait after a change before writing the cache out, so a burst of
+# new entries costs one write.
+SAVE_DELAY = 5.0
+
+# Utterances whose answer depends on when they are asked are never cached.
+_NO_CACHE_RE = re.compile(
+    r'\b(?:time|date|day|today|tonight|tomorrow|yesterday|now|weather|news|latest)\b'
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+# Only replies that trigger an action are cached; chit-chat depends on the
+# conversation so far and should not be replayed.
+_ACTION_TAG = '<action>'
+# Contents of each action tag in a reply
+_ACTION_RE = re.compile(r'<action>(.*?)</action>', re.IGNORECASE | re.DOTALL)
+# Actions that change files, type text or end the process. A paraphrase is
+# never enough to replay one of these.
+_DESTRUCTIVE_ACTIONS = frozenset({
+    'write_file', 'delete_file', 'edit_file', 'append_to_file', 'create_directory',
+    'move_file', 'copy_file', 'write_code', 'dictate', 'reboot', 'shut_down',
+})
+# Commands that refer back to an earlier turn ("do that again", "turn it up")
+# mean something different in every conversation, so they are never cached.
+_CONTEXT_RE = re.compile(r'\b(?:again|it|that|this|those|them|same|previous|last|other)\b')
+
+_exact_cache = OrderedDict()
+_lock = threading.Lock()
+# Serializes writes of the cache files
+_save_lock = threading.Lock()
+_save_timer = None
+_dirty = False
+
+def _write_atomic(path, data):
+    # Write to a temporary file and swap it in, so a crash can't leave a torn file
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class SemanticCache:
+    """
+    Fixed-size ring buffer of (embedding, reply) pairs, searched by cosine similarity.
+    The oldest entry is overwritten once the buffer is full.
+    """
+
+    def __init__(self, model_name=SEMANTIC_MODEL, capacity=SEMANTIC_CACHE_SIZE,
+                 threshold=SIMILARITY_THRESHOLD):
+        self.model_name = model_name
+        self.capacity = capacity
+        self.threshold = threshold
+        self._model = None
+        self._disabled = False
+        self._embeddings = None
+        self._replies = [None] * capacity
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+
+    def _embed(self, text):
+        """Unit-length embedding of the text, or None if the model is unavailable."""
+        if self._disabled:
+            return None
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    logger.info("Loading embedding model %s", self.model_name)
+                    self._model = SentenceTransformer(self.model_name)
+                except Exception as e:
+                    logger.error("Error loading embedding model, semantic cache disabled: %s", e)
+                    self._disabled = True
+                    return None
+        return self._model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def get(self, text):
+        """Return the reply cached for the most similar prompt, or None."""
+        if self._count == 0:
+            return None
+        try:
+            query = self._embed(text)
+            if query is None:
+                return None
+            with self._lock:
+                # Vectors are unit length, so the dot product is the cosine similarity
+                scores = self._embeddings[:self._count] @ query
+                best = int(np.argmax(scores))
+                if scores[best] < self.threshold:
+                    return None
+                logger.debug("Semantic cache hit (similarity %.3f)", scores[best])
+                return self._replies[best]
+        except Exception as e:
+            logger.error("Error searching semantic cache: %s", e)
+            return None
+
+    def put(self, text, reply):
+        """Add a prompt and its reply, evicting the oldest entry when full."""
+        try:
+            vector = self._embed(text)
+            if vector is None:
+                return
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = np.empty((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._embeddings[self._next] = vector
+                self._replies[self._next] = reply
+                self._next = (self._next + 1) % self.capacity
+                self._count = min(self._count + 1, self.capacity)
+        except Exception as e:
+            logger.error("Error adding to semantic cache: %s", e)
+
+    def clear(self):
+        """Forget every cached reply."""
+        with self._lock:
+            self._replies = [None] * self.capacity
+            self._count = 0
+            self._next = 0
+
+    def save(self, vectors_file, replies_file):
+        """Write the entries, oldest first, as a .npy matrix plus a JSON list of replies."""
+        with self._lock:
+            if self._count < self.capacity:
+                order = list(range(self._count))
+            else:
+                order = [(self._next + i) % self.capacity for i in range(self.capacity)]
+            vectors = self._embeddings[order] if self._embeddings is not None else np.empty((0, 0), np.float32)
+            replies = [self._replies[i] for i in order]
+        buffer = io.BytesIO()
+        np.save(buffer, vectors)
+        _write_atomic(vectors_file, buffer.getvalue())
+        _write_atomic(replies_file, json.dumps({"model": self.model_name, "replies": replies}).encode('utf-8'))
+
+    def load(self, vectors_file, replies_file):
+        """Restore entries written by save(); ignores files from a different model."""
+        try:
+            with open(replies_file, 'rb') as f:
+                saved = json.loads(f.read())
+            if saved.get("model") != self.model_name:
+                logger.info("Ignoring semantic cache built with %s", saved.get("model"))
+                return
+            replies = saved["replies"][-self.capacity:]
+            vectors = np.load(vectors_file)[-self.capacity:] if replies else None
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error("Error loading semantic cache: %s", e)
+            return
+        if not replies:
+            return
+        if len(vectors) != len(replies):
+            logger.warning("Semantic cache files don't match, starting empty")
+            return
+        with self._lock:
+            count = len(replies)
+            self._embeddings = np.empty((self.capacity, vectors.shape[1]), dtype=np.float32)
+            self._embeddings[:count] = vectors
+            self._replies = replies + [None] * (self.capacity - count)
+            self._count = count
+            self._next = count % self.capacity
+        logger.debug("Loaded %d semantic cache entries", count)
+
+# Shared semantic tier; None when sentence-transformers is not installed.
+semantic_cache = SemanticCache() if SentenceTransformer is not None else None
+
+def _cache_key(prompt):
+    """Normalized key for a prompt, or None if the prompt must not be cached."""
+    key = _WHITESPACE_RE.sub(' ', prompt).strip().lower()
+    if not key or _NO_CACHE_RE.search(key) or _CONTEXT_RE.search(key):
+        return None
+    return key
+
+def _safe_for_paraphrase(key, reply):
+    """
+    Whether a reply cached for a similar command may answer this one.
+    Destructive actions never qualify, and every action parameter must appear
+    in the command itself, so "volume 30" can't replay a reply for "volume 80".
+    """
+    for tag in _ACTION_RE.findall(reply):
+        name, _, params_text = tag.partition(':')
+        if name.strip().replace(' ', '_').lower() in _DESTRUCTIVE_ACTIONS:
+            return False
+        for param in params_text.split(','):
+            param = _WHITESPACE_RE.sub(' ', param.replace('_', ' ')).strip().lower()
+            if param and not re.search(r'(?<!\w)' + re.escape(param) + r'(?!\w)', key):
+                return False
+    return True
+
+def get(prompt):
+    """
+    Return the cached reply for a prompt, or None on a miss.
+    Runs the embedding model on an exact miss, so call it off the event loop.
+    """
+    key = _cache_key(prompt)
+    if key is None:
+        return None
+    with _lock:
+        reply = _exact_cache.get(key)
+        if reply is not None:
+            _exact_cache.move_to_end(key)
+    if reply is not None:
+        logger.debug("Response cache hit for: %s", key)
+        return reply
+    if semantic_cache is not None:
+        reply = semantic_cache.get(key)
+        if reply is not None and not _safe_for_paraphrase(key, reply):
+            logger.debug("Ignoring semantic cache hit that doesn't fit: %s", key)
+            return None
+        if reply is not None:
+            # Remember this wording too, so the next repeat skips the model
+            _store_exact(key, reply)
+            _schedule_save()
+    return reply
+
+def _store_exact(key, reply):
+    with _lock:
+        _exact_cache[key] = reply
+        _exact_cache.move_to_end(key)
+        if len(_exact_cache) > EXACT_CACHE_SIZE:
+            _exact_cache.popitem(last=False)
+
+def put(prompt, reply):
+    """Remember the reply to a prompt if it is safe to replay later."""
+    key = _cache_key(prompt)
+    if key is None or _ACTION_TAG not in reply.lower():
+        return
+    _store_exact(key, reply)
+    if semantic_cache is not None and _safe_for_paraphrase(key, reply):
+        semantic_cache.put(key, reply)
+    _schedule_save()
+
+def clear():
+    """Forget every cached reply."""
+    with _lock:
+        _exact_cache.clear()
+    if semantic_cache is not None:
+        semantic_cache.clear()
+    _schedule_save()
+
+def _schedule_save():
+    global _save_timer, _dirty
+    with _lock:
+        _dirty = True
+        if _save_timer is None:
+            _save_timer = threading.Timer(SAVE_DELAY, flush_cache)
+            _save_timer.daemon = True
+            _save_timer.start()
+
+def flush_cache():
+    """Write pending cache changes to disk immediately."""
+    global _save_timer, _dirty
+    with _lock:
+        if _save_timer is not None:
+            _save_timer.cancel()
+            _save_timer = None
+        if not _dirty:
+            return
+        _dirty = False
+    save()
+
+def save():
+    """Write both cache tiers to disk. Does file I/O, so call it off the event loop."""
+    with _save_lock:
+        try:
+            CACHE_DIR.mkdir(exist_ok=True)
+            with _lock:
+                entries = list(_exact_cache.items())
+            _write_atomic(EXACT_CACHE_FILE, json.dumps(entries).encode('utf-8'))
+            if semantic_cache is not None:
+                semantic_cache.save(SEMANTIC_VECTORS_FILE, SEMANTIC_REPLIES_FILE)
+        except Exception as e:
+            logger.error("Error saving response cache: %s", e)
+
+def _load():
+    try:
+        with open(EXACT_CACHE_FILE, 'rb') as f:
+            entries = json.loads(f.read())
+    except FileNotFoundError:
+        entries = []
+    except Exception as e:
+        logger.error("Error loading response cache: %s", e)
+        entries = []
+    with _lock:
+        for key, reply in entries[-EXACT_CACHE_SIZE:]:
+            _exact_cache[key] = reply
+    if semantic_cache is not None:
+        semantic_cache.load(SEMANTIC_VECTORS_FILE, SEMANTIC_REPLIES_FILE)
+    logger.debug("Loaded %d cached responses", len(entries))
+
+_load()
+atexit.register(flush_cache)
@@ -1,82 +1,217 @@
-import speech_recognition as sr
+import math
+import os
+import threading
 import time
+from array import array
+import speech_recognition as sr
 from logger_config import get_logger
 
+try:
+    import numpy as np
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
 # Configure logging using the new thread-specific logger
 logger = get_logger(__name__)
 
+# Local Whisper model used for transcription when faster-whisper is installed;
+# otherwise audio is sent to Google's recognizer.
+WHISPER_MODEL = os.getenv('MARVIN_WHISPER_MODEL', 'small.en')
+WHISPER_SAMPLE_RATE = 16000
+_whisper_model = None
+_whisper_failed = False
+_whisper_lock = threading.Lock()
+
 # Track consecutive failed attempts to dynamically adjust sensitivity
 consecutive_failures = 0
 MAX_CONSECUTIVE_FAILURES = 3
 BASE_ENERGY_THRESHOLD = 300
 ADJUSTED_ENERGY_THRESHOLD = 500
+# By default the energy threshold is fixed: BASE_ENERGY_THRESHOLD, or
+# ADJUSTED_ENERGY_THRESHOLD while recognition keeps failing. Set
+# MARVIN_CALIBRATE_MIC=1 to use the measured ambient noise level instead; it is
+# clamped to MAX_ENERGY_THRESHOLD so a noisy calibration can't drown out the wake word.
+CALIBRATE_MIC = os.getenv('MARVIN_CALIBRATE_MIC') == '1'
+MAX_ENERGY_THRESHOLD = 1500
+# Threshold every listen starts from; the recognizer's own adjustment during
+# one listen is not carried over to the next
+_energy_threshold = BASE_ENERGY_THRESHOLD
+
+# Microphone stream and recognizer kept open between utterances
+_recognizer = None
+_source = None
+_mic_lock = threading.Lock()
+
+# Seconds of ambient noise measured when the microphone is first opened, and on recalibration
+STARTUP_CALIBRATION_SECONDS = 1.0
+RECALIBRATION_SECONDS = 0.5
+# Recalibrate at least this often, in seconds, even if recognition keeps working
+RECALIBRATE_INTERVAL = 300.0
+# The start of every capture is background noise from before the user spoke. Its
+# level is tracked as a moving average, and a recalibration is scheduled once
+# that average drifts this far from its level right after the last calibration.
+NOISE_SAMPLE_SECONDS = 0.1
+NOISE_EMA_WEIGHT = 0.05
+NOISE_DRIFT = 0.3
+_last_calibration = 0.0
+_noise_baseline = None
+_noise_ema = None
+_recalibrate = False
+
+def _get_whisper_model():
+    """The shared Whisper model, loaded on first use, or None if it is unavailable."""
+    global _whisper_model, _whisper_failed
+    if WhisperModel is None or _whisper_failed:
+        return None
+    with _whisper_lock:
+        if _whisper_model is None and not _whisper_failed:
+            try:
+                logger.info("Loading Whisper model %s", WHISPER_MODEL)
+                # int8 weights: a fraction of the memory traffic of fp32 on CPU
+                _whisper_model = WhisperModel(WHISPER_MODEL, device="cpu", compute_type="int8")
+            except Exception as e:
+                logger.error("Error loading Whisper model, falling back to Google: %s", e)
+                _whisper_failed = True
+        return _whisper_model
+
+def preload_whisper_model():
+    """Load the Whisper model now instead of on the first utterance."""
+    _get_whisper_model()
+
+def _recognize(recognizer, audio):
+    """Convert captured audio to text, locally when possible."""
+    model = _get_whisper_model()
+    if model is None:
+        return recognizer.recognize_google(audio)
+    # Whisper wants 16 kHz mono float samples in [-1, 1]
+    pcm = audio.get_raw_data(convert_rate=WHISPER_SAMPLE_RATE, convert_width=2)
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    segments, _ = model.transcribe(samples, language="en", beam_size=1)
+    text = "".join(segment.text for segment in segments).strip()
+    if not text:
+        raise sr.UnknownValueError()
+    return text
+
+def _open_microphone():
+    """
+    The shared recognizer and microphone, opened on first use. The stream stays
+    open for the life of the process so each utterance skips the device open and
+    the ambient noise calibration.
+    """
+    global _recognizer, _source
+    if _source is None:
+        recognizer = sr.Recognizer()
+        # Wait longer for the user to finish a sentence (default is 0.8 seconds)
+        recognizer.pause_threshold = 2.0
+        # Minimum silence after speech before the phrase is considered complete
+        recognizer.non_speaking_duration = 1.0
+        source = sr.Microphone()
+        source.__enter__()
+        logger.debug('Opened microphone stream')
+        _recognizer, _source = recognizer, source
+        if CALIBRATE_MIC:
+            _calibrate(BASE_ENERGY_THRESHOLD, STARTUP_CALIBRATION_SECONDS)
+    return _recognizer, _source
+
+def _close_microphone():
+    """Close the microphone stream so the next call reopens it."""
+    global _recognizer, _source
+    if _source is not None:
+        try:
+            _source.__exit__(None, None, None)
+        except Exception as e:
+            logger.debug('Error closing microphone: %s', e)
+    _recognizer = _source = None
+
+def _calibrate(min_threshold, duration=RECALIBRATION_SECONDS):
+    """
+    Measure the ambient noise and set the energy threshold from it, between
+    min_threshold and MAX_ENERGY_THRESHOLD.
+    """
+    global _energy_threshold, _last_calibration, _noise_baseline, _noise_ema, _recalibrate
+    _recognizer.adjust_for_ambient_noise(_source, duration=duration)
+    _energy_threshold = min(max(_recognizer.energy_threshold, min_threshold), MAX_ENERGY_THRESHOLD)
+    _last_calibration = time.monotonic()
+    _noise_baseline = _noise_ema = None
+    _recalibrate = False
+    logger.debug("Energy threshold set to %d", _energy_threshold)
+
+def _track_noise(audio):
+    """Update the background noise average from the start of a capture."""
+    global _noise_baseline, _noise_ema, _recalibrate
+    # The microphone records 16-bit samples
+    if audio.sample_width != 2:
+        return
+    size = int(audio.sample_rate * NOISE_SAMPLE_SECONDS) * audio.sample_width
+    samples = array('h', audio.frame_data[:size])
+    if not samples:
+        return
+    rms = math.sqrt(sum(x * x for x in samples) / len(samples))
+    if _noise_baseline is None:
+        _noise_baseline = _noise_ema = max(rms, 1.0)
+        return
+    _noise_ema = (1 - NOISE_EMA_WEIGHT) * _noise_ema + NOISE_EMA_WEIGHT * rms
+    if abs(_noise_ema - _noise_baseline) / _noise_baseline > NOISE_DRIFT:
+        logger.debug("Background noise drifted from %.0f to %.0f", _noise_baseline, _noise_ema)
+        _recalibrate = True
 
 def transcribe_speech_to_text() -> str:
     global consecutive_failures
     
     logger.debug('Entering transcribe_speech_to_text function')
-    recognizer = sr.Recognizer()
-    source = None
-    try:
-        source = sr.Microphone()
-        with source:
-            logger.debug('Acquired microphone resource')
-            
-            # Adjust for ambient noise with a reasonable duration
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
+    with _mic_lock:
+        try:
+            recognizer, source = _open_microphone()
             
-            # Dynamically adjust energy threshold based on consecutive failures
-            if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
-                recognizer.energy_threshold = ADJUSTED_ENERGY_THRESHOLD
-                logger.debug(f"Using higher energy threshold ({ADJUSTED_ENERGY_THRESHOLD}) after {consecutive_failures} consecutive failures")
+            if not CALIBRATE_MIC:
+                # Fixed threshold, raised while recognition keeps failing
+                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    recognizer.energy_threshold = ADJUSTED_ENERGY_THRESHOLD
+                else:
+                    recognizer.energy_threshold = BASE_ENERGY_THRESHOLD
             else:
-                recognizer.energy_threshold = BASE_ENERGY_THRESHOLD
-                logger.debug(f"Using standard energy threshold ({BASE_ENERGY_THRESHOLD})")
-            
-            # Increase the pause threshold significantly to wait longer for the user to finish speaking
-            # Default is 0.8 seconds, increasing to 2.0 gives much more time to finish a sentence
-            recognizer.pause_threshold = 2.0
-            
-            # Set a higher non-speaking duration to prevent premature cutoffs
-            # This is the minimum length of silence after speech before considering the phrase complete
-            recognizer.non_speaking_duration = 1.0
+                # Recalibrate only when recognition keeps failing (with a higher floor),
+                # when the background noise has changed, or when it has been a while
+                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    logger.debug("Recalibrating after %d consecutive failures", consecutive_failures)
+                    _calibrate(ADJUSTED_ENERGY_THRESHOLD)
+                    consecutive_failures = 0
+                elif _recalibrate or time.monotonic() - _last_calibration > RECALIBRATE_INTERVAL:
+                    logger.debug("Recalibrating for background noise")
+                    _calibrate(BASE_ENERGY_THRESHOLD)
+                recognizer.energy_threshold = _energy_threshold
             
             logger.debug("Listening...")
-            logger.debug('Starting speech recognition')
             
             # Use a longer timeout and add a generous phrase time limit
             # This prevents cutting off long sentences while still having a reasonable timeout
             audio = recognizer.listen(source, timeout=10, phrase_time_limit=20)
+            if CALIBRATE_MIC:
+                _track_noise(audio)
             
             logger.debug('Speech recognition completed')
             
-            text = recognizer.recognize_google(audio)
+            text = _recognize(recognizer, audio)
             logger.debug("You said: %s", text)
             
             # Reset consecutive failures counter on success
             consecutive_failures = 0
             return text
-    except sr.UnknownValueError:
-        logger.warning('Could not understand audio')
-        # Increment failure counter but don't add delay
-        consecutive_failures += 1
-        return ""
-    except sr.RequestError as e:
-        logger.error('Speech recognition service error: %s', e)
-        return ""
-    except sr.WaitTimeoutError:
-        logger.debug('No speech detected within timeout period')
-        consecutive_failures += 1
-        return ""
-    except Exception as e:
-        logger.error(f'Unexpected error in speech recognition: {e}')
-        return ""
-    finally:
-        logger.debug('Speech recognition finished')
-        if source is not None:
-            try:
-                source.__exit__(None, None, None)
-            except AttributeError:
-                pass
-    logger.debug('Exiting transcribe_speech_to_text function')
-    return ""
+        except sr.UnknownValueError:
+            logger.warning('Could not understand audio')
+            # Increment failure counter but don't add delay
+            consecutive_failures += 1
+            return ""
+        except sr.RequestError as e:
+            logger.error('Speech recognition service error: %s', e)
+            return ""
+        except sr.WaitTimeoutError:
+            logger.debug('No speech detected within timeout period')
+            consecutive_failures += 1
+            return ""
+        except Exception as e:
+            logger.error('Unexpected error in speech recognition: %s', e)
+            # The device may have gone away; reopen it on the next call
+            _close_microphone()
+            return ""
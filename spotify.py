@@ -1,82 +1,292 @@
+import asyncio
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
 import spotipy
+from requests.adapters import HTTPAdapter
 from spotipy.oauth2 import SpotifyOAuth
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-import logging
+from logger_config import get_logger
+
+# Get a logger for this module
+logger = get_logger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Seconds the active device and its volume are trusted before asking Spotify again
+DEVICE_CACHE_TTL = 5.0
+# Playlist names are looked up in an index kept on disk between runs. A name
+# that isn't in it triggers a rebuild, at most once per PLAYLIST_INDEX_TTL seconds.
+PLAYLIST_INDEX_FILE = Path(__file__).resolve().parent / 'cache' / 'playlists.json'
+PLAYLIST_INDEX_TTL = 60.0
+# Largest page the playlists endpoint returns
+PLAYLIST_PAGE_SIZE = 50
+# Requests in flight at once (playlist pages, or a device check next to a
+# lookup); spotipy retries any that are rate limited
+PLAYLIST_FETCH_WORKERS = 4
+_request_executor = ThreadPoolExecutor(max_workers=PLAYLIST_FETCH_WORKERS, thread_name_prefix='spotify')
+# Steady request rate allowed to Spotify, and how many may go out at once after a quiet spell
+REQUESTS_PER_SECOND = 10.0
+REQUEST_BURST = 10
+
+class RateLimiter:
+    """
+    Leaky bucket shared by every thread: allows a burst of requests, then spaces
+    them out to a steady rate. Keeping under the limit avoids 429 responses,
+    whose Retry-After backoff costs far more than a short wait here.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Take the token now, even if it has to be waited for, so callers queue in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            logger.debug("Spotify rate limit: waiting %.2f s", wait)
+            time.sleep(wait)
+
+class _RateLimitedSession(requests.Session):
+    """Session that passes every request through a RateLimiter first."""
+
+    def __init__(self, limiter):
+        super().__init__()
+        self._limiter = limiter
+
+    def request(self, *args, **kwargs):
+        self._limiter.acquire()
+        return super().request(*args, **kwargs)
+
+def _build_session():
+    """
+    One keep-alive, rate-limited session for the API and the token endpoint, with
+    a pool big enough for the concurrent playlist fetches. Retries match spotipy's
+    own defaults, which it only sets up on sessions it creates itself.
+    """
+    retry = Retry(
+        total=3,
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=PLAYLIST_FETCH_WORKERS * 2, max_retries=retry)
+    session = _RateLimitedSession(RateLimiter(REQUESTS_PER_SECOND, REQUEST_BURST))
+    session.mount('https://', adapter)
+    return session
+
 class SpotifyClient:
     def __init__(self):
+        # Kept for the life of the client so calls reuse warm connections
+        self._session = _build_session()
         self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
             client_id=os.getenv('SPOTIFY_CLIENT_ID'),
             client_secret=os.getenv('SPOTIFY_CLIENT_SECRET'),
             redirect_uri=os.getenv('SPOTIFY_REDIRECT_URI'),
-            scope='playlist-read-private playlist-read-collaborative user-library-read user-read-playback-state user-modify-playback-state'
-        ))
+            scope='playlist-read-private playlist-read-collaborative user-library-read user-read-playback-state user-modify-playback-state',
+            requests_session=self._session
+        ), requests_session=self._session)
+        # Active device id and its volume, with the time each was fetched
+        self._device_id = None
+        self._device_active = False
+        self._device_fetched = float('-inf')
+        self._volume = None
+        self._volume_fetched = float('-inf')
+        # Lower-cased playlist name -> URI, and the wall-clock time it was built
+        self._playlist_index = {}
+        self._playlist_index_time = 0.0
+        self._load_playlist_index()
+
+    def _invalidate_cache(self):
+        """Forget the cached device and volume, e.g. after a failed request."""
+        self._device_id = None
+        self._device_active = False
+        self._device_fetched = float('-inf')
+        self._volume = None
+        self._volume_fetched = float('-inf')
 
     def _get_active_device(self):
+        if time.monotonic() - self._device_fetched < DEVICE_CACHE_TTL:
+            return self._device_id
         devices = self.sp.devices()
+        device = None
         if devices and devices.get('devices') and len(devices['devices']) > 0:
-            return devices['devices'][0]['id']
-        return None
+            # Prefer the device that is already playing
+            device = next((d for d in devices['devices'] if d.get('is_active')), devices['devices'][0])
+        self._device_id = device['id'] if device else None
+        self._device_active = bool(device and device.get('is_active'))
+        self._device_fetched = time.monotonic()
+        return self._device_id
+
+    def _get_volume(self):
+        """Current volume of the active device, or None if nothing is playing."""
+        if self._volume is not None and time.monotonic() - self._volume_fetched < DEVICE_CACHE_TTL:
+            return self._volume
+        current_playback = self.sp.current_playback()
+        if not current_playback or 'device' not in current_playback:
+            return None
+        self._set_volume(current_playback['device']['volume_percent'])
+        return self._volume
+
+    def _set_volume(self, volume):
+        self._volume = volume
+        self._volume_fetched = time.monotonic()
 
     def _ensure_active_device(self):
         device_id = self._get_active_device()
-        if device_id:
+        # Transferring to the device that is already active would be a wasted round trip
+        if device_id and not self._device_active:
             self.sp.transfer_playback(device_id, force_play=True)
+            self._device_active = True
         return device_id
 
-    def play_track(self, track_name):
-        device_id = self._ensure_active_device()
-        if not device_id:
-            return False
-
+    def _search_track(self, track_name):
+        """URI of the best match for a track name, or None."""
         # Clean up track name by replacing underscores with spaces
         clean_track_name = track_name.replace('_', ' ')
         results = self.sp.search(q=clean_track_name, limit=1, type='track')
         if results.get('tracks') and results['tracks'].get('items') and len(results['tracks']['items']) > 0:
-            track_uri = results['tracks']['items'][0]['uri']
-            self.sp.start_playback(device_id=device_id, uris=[track_uri])
-            return True
-        return False
+            return results['tracks']['items'][0]['uri']
+        logger.info("No track found for '%s'", clean_track_name)
+        return None
+
+    def play_track(self, track_name):
+        return self.play_tracks([track_name])
+
+    def play_tracks(self, track_names):
+        """
+        Search for every track at once and play the matches, in order, with a
+        single start_playback call. Returns False if nothing could be played.
+        """
+        # The device check and the searches don't depend on each other, so run them together
+        device_future = _request_executor.submit(self._ensure_active_device)
+        uris = [uri for uri in _request_executor.map(self._search_track, track_names) if uri]
+        device_id = device_future.result()
+        if not device_id or not uris:
+            return False
+        self.sp.start_playback(device_id=device_id, uris=uris)
+        return True
+
+    def _playlist_pages(self):
+        """
+        Yield the user's playlists one page at a time, in library order. The first
+        page gives the total; the rest are then requested concurrently, so a large
+        library costs about two round trips instead of one per page.
+        """
+        first = self.sp.current_user_playlists(limit=PLAYLIST_PAGE_SIZE, offset=0)
+        logger.info("Found %d playlists in your library", first['total'])
+        yield first['items']
+        offsets = range(PLAYLIST_PAGE_SIZE, first['total'], PLAYLIST_PAGE_SIZE)
+        if not offsets:
+            return
+        pages = _request_executor.map(
+            lambda offset: self.sp.current_user_playlists(limit=PLAYLIST_PAGE_SIZE, offset=offset),
+            offsets
+        )
+        for page in pages:
+            yield page['items']
+
+    def _load_playlist_index(self):
+        try:
+            with open(PLAYLIST_INDEX_FILE, 'rb') as f:
+                saved = json.loads(f.read())
+            self._playlist_index = saved['playlists']
+            self._playlist_index_time = saved['saved']
+            logger.debug("Loaded %d playlists from %s", len(self._playlist_index), PLAYLIST_INDEX_FILE)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Error loading playlist index: %s", e)
+
+    def _save_playlist_index(self):
+        try:
+            PLAYLIST_INDEX_FILE.parent.mkdir(exist_ok=True)
+            data = json.dumps({"saved": self._playlist_index_time, "playlists": self._playlist_index})
+            tmp_file = PLAYLIST_INDEX_FILE.with_name(PLAYLIST_INDEX_FILE.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_file, PLAYLIST_INDEX_FILE)
+        except Exception as e:
+            logger.error("Error saving playlist index: %s", e)
+
+    def _refresh_playlist_index(self):
+        """Rebuild the lower-cased name -> URI index from the whole library."""
+        index = {}
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for page in self._playlist_pages():
+            for playlist in page:
+                if debug:
+                    logger.debug("- %s (ID: %s)", playlist['name'], playlist['id'])
+                # The first playlist with a given name wins
+                index.setdefault(playlist['name'].lower(), playlist['uri'])
+        self._playlist_index = index
+        self._playlist_index_time = time.time()
+        self._save_playlist_index()
+
+    def _find_playlist(self, name):
+        """
+        URI of the playlist with this lower-cased name, or None. A known name is
+        served from the index; an unknown one rebuilds the index first, unless it
+        was rebuilt in the last PLAYLIST_INDEX_TTL seconds.
+        """
+        uri = self._playlist_index.get(name)
+        if uri is None and time.time() - self._playlist_index_time >= PLAYLIST_INDEX_TTL:
+            self._refresh_playlist_index()
+            uri = self._playlist_index.get(name)
+        return uri
 
     def play_playlist(self, playlist_name):
         try:
-            device_id = self._ensure_active_device()
-            if not device_id:
-                logging.warning("No active device found")
-                return False
+            # Check the device while the playlist is looked up
+            device_future = _request_executor.submit(self._ensure_active_device)
 
             # Clean up playlist name by replacing underscores with spaces
             clean_playlist_name = playlist_name.replace('_', ' ')
-            logging.info("Looking for playlist: '%s'", clean_playlist_name)
-
-            # Search with increased limit
-            offset = 0
-            limit = 50
-            while True:
-                playlists = self.sp.current_user_playlists(limit=limit, offset=offset)
-                logging.info("Found %d playlists in your library (showing %d to %d)", playlists['total'], offset + 1, offset + len(playlists['items']))
-
-                for playlist in playlists['items']:
-                    logging.info("- %s (ID: %s)", playlist['name'], playlist['id'])
-                    if playlist['name'].lower() == clean_playlist_name.lower():
-                        logging.info("Found matching playlist: %s", playlist['name'])
-                        self.sp.start_playback(device_id=device_id, context_uri=playlist['uri'])
-                        return True
-
-                if len(playlists['items']) < limit:
-                    break
-
-            logging.info("No playlist named '%s' found in your library", playlist_name)
-            return False
+            logger.info("Looking for playlist: '%s'", clean_playlist_name)
+
+            uri = self._find_playlist(clean_playlist_name.lower())
+            device_id = device_future.result()
+            if not device_id:
+                logger.warning("No active device found")
+                return False
+            if uri is None:
+                logger.info("No playlist named '%s' found in your library", playlist_name)
+                return False
+
+            logger.info("Found matching playlist: %s", clean_playlist_name)
+            try:
+                self.sp.start_playback(device_id=device_id, context_uri=uri)
+            except spotipy.exceptions.SpotifyException as e:
+                if e.http_status == 404:
+                    # Deleted since the index was built; the next call rebuilds it
+                    self._playlist_index = {}
+                    self._playlist_index_time = 0.0
+                raise
+            return True
         except spotipy.exceptions.SpotifyException as e:
-            logging.error("Spotify API error: %s", str(e))
+            logger.error("Spotify API error: %s", e)
+            self._invalidate_cache()
             return False
         except Exception as e:
-            logging.error("Unexpected error: %s", str(e))
+            logger.error("Unexpected error: %s", e)
             return False
             
     def pause_music(self):
@@ -84,17 +294,18 @@ class SpotifyClient:
         try:
             device_id = self._get_active_device()
             if not device_id:
-                logging.warning("No active device found")
+                logger.warning("No active device found")
                 return False
                 
             self.sp.pause_playback(device_id=device_id)
-            logging.info("Music paused")
+            logger.info("Music paused")
             return True
         except spotipy.exceptions.SpotifyException as e:
-            logging.error("Spotify API error: %s", str(e))
+            logger.error("Spotify API error: %s", e)
+            self._invalidate_cache()
             return False
         except Exception as e:
-            logging.error("Unexpected error: %s", str(e))
+            logger.error("Unexpected error: %s", e)
             return False
             
     def unpause_music(self):
@@ -102,17 +313,18 @@ class SpotifyClient:
         try:
             device_id = self._get_active_device()
             if not device_id:
-                logging.warning("No active device found")
+                logger.warning("No active device found")
                 return False
                 
             self.sp.start_playback(device_id=device_id)
-            logging.info("Music resumed")
+            logger.info("Music resumed")
             return True
         except spotipy.exceptions.SpotifyException as e:
-            logging.error("Spotify API error: %s", str(e))
+            logger.error("Spotify API error: %s", e)
+            self._invalidate_cache()
             return False
         except Exception as e:
-            logging.error("Unexpected error: %s", str(e))
+            logger.error("Unexpected error: %s", e)
             return False
             
     def stop_music(self):
@@ -120,7 +332,7 @@ class SpotifyClient:
         try:
             device_id = self._get_active_device()
             if not device_id:
-                logging.warning("No active device found")
+                logger.warning("No active device found")
                 return False
                 
             # First pause playback
@@ -129,13 +341,14 @@ class SpotifyClient:
             # Then seek to position 0 (beginning of track)
             self.sp.seek_track(position_ms=0, device_id=device_id)
             
-            logging.info("Music stopped")
+            logger.info("Music stopped")
             return True
         except spotipy.exceptions.SpotifyException as e:
-            logging.error("Spotify API error: %s", str(e))
+            logger.error("Spotify API error: %s", e)
+            self._invalidate_cache()
             return False
         except Exception as e:
-            logging.error("Unexpected error: %s", str(e))
+            logger.error("Unexpected error: %s", e)
             return False
             
     def volume_up(self, increment=10):
@@ -143,26 +356,27 @@ class SpotifyClient:
         try:
             device_id = self._get_active_device()
             if not device_id:
-                logging.warning("No active device found")
+                logger.warning("No active device found")
                 return False
                 
-            # Get current playback state to check volume
-            current_playback = self.sp.current_playback()
-            if not current_playback or 'device' not in current_playback:
-                logging.warning("No active playback found")
+            # Volume is cached, so repeated presses don't re-read the playback state
+            current_volume = self._get_volume()
+            if current_volume is None:
+                logger.warning("No active playback found")
                 return False
                 
-            current_volume = current_playback['device']['volume_percent']
             new_volume = min(100, current_volume + increment)
             
             self.sp.volume(new_volume, device_id=device_id)
-            logging.info(f"Volume increased from {current_volume}% to {new_volume}%")
+            self._set_volume(new_volume)
+            logger.info("Volume increased from %d%% to %d%%", current_volume, new_volume)
             return True
         except spotipy.exceptions.SpotifyException as e:
-            logging.error("Spotify API error: %s", str(e))
+            logger.error("Spotify API error: %s", e)
+            self._invalidate_cache()
             return False
         except Exception as e:
-            logging.error("Unexpected error: %s", str(e))
+            logger.error("Unexpected error: %s", e)
             return False
             
     def volume_down(self, decrement=10):
@@ -170,24 +384,60 @@ class SpotifyClient:
         try:
             device_id = self._get_active_device()
             if not device_id:
-                logging.warning("No active device found")
+                logger.warning("No active device found")
                 return False
                 
-            # Get current playback state to check volume
-            current_playback = self.sp.current_playback()
-            if not current_playback or 'device' not in current_playback:
-                logging.warning("No active playback found")
+            # Volume is cached, so repeated presses don't re-read the playback state
+            current_volume = self._get_volume()
+            if current_volume is None:
+                logger.warning("No active playback found")
                 return False
                 
-            current_volume = current_playback['device']['volume_percent']
             new_volume = max(0, current_volume - decrement)
             
             self.sp.volume(new_volume, device_id=device_id)
-            logging.info(f"Volume decreased from {current_volume}% to {new_volume}%")
+            self._set_volume(new_volume)
+            logger.info("Volume decreased from %d%% to %d%%", current_volume, new_volume)
             return True
         except spotipy.exceptions.SpotifyException as e:
-            logging.error("Spotify API error: %s", str(e))
+            logger.error("Spotify API error: %s", e)
+            self._invalidate_cache()
             return False
         except Exception as e:
-            logging.error("Unexpected error: %s", str(e))
-            return False
\ No newline at end of file
+            logger.error("Unexpected error: %s", e)
+            return False
+
+    # Async variants of the public methods. spotipy is blocking, so each runs
+    # the call in a worker thread and the event loop keeps going meanwhile.
+
+    async def aplay_track(self, track_name):
+        """Async version of play_track."""
+        return await asyncio.to_thread(self.play_track, track_name)
+
+    async def aplay_tracks(self, track_names):
+        """Async version of play_tracks."""
+        return await asyncio.to_thread(self.play_tracks, track_names)
+
+    async def aplay_playlist(self, playlist_name):
+        """Async version of play_playlist."""
+        return await asyncio.to_thread(self.play_playlist, playlist_name)
+
+    async def apause_music(self):
+        """Async version of pause_music."""
+        return await asyncio.to_thread(self.pause_music)
+
+    async def aunpause_music(self):
+        """Async version of unpause_music."""
+        return await asyncio.to_thread(self.unpause_music)
+
+    async def astop_music(self):
+        """Async version of stop_music."""
+        return await asyncio.to_thread(self.stop_music)
+
+    async def avolume_up(self, increment=10):
+        """Async version of volume_up."""
+        return await asyncio.to_thread(self.volume_up, increment)
+
+    async def avolume_down(self, decrement=10):
+        """Async version of volume_down."""
+        return await asyncio.to_thread(self.volume_down, decrement)
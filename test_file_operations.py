@@ -7,6 +7,7 @@ This allows testing file operations without requiring voice commands.
 import os
 import logging
 import argparse
+from functools import lru_cache
 from file_operations import FileOperations
 
 # Configure logging
@@ -14,7 +15,9 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
+@lru_cache(maxsize=1)
+def _build_parser():
+    """Command-line parser, built once and reused by every call to main()."""
     # Set up command-line argument parsing
     parser = argparse.ArgumentParser(description='Test Marvin\'s file operations functionality')
     
@@ -70,92 +73,97 @@ def main():
     search_parser.add_argument('text', type=str, help='Text to search for')
     search_parser.add_argument('--dir', type=str, default='', help='Subdirectory to search in')
     
+    return parser
+
+def main(argv=None):
+    parser = _build_parser()
+    
     # Parse arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Initialize FileOperations
     file_ops = FileOperations()
     
     # Display the artifacts directory
-    logger.info(f"Using artifacts directory: {file_ops.artifacts_dir}")
+    logger.info("Using artifacts directory: %s", file_ops.artifacts_dir)
     
     # Execute command based on arguments
     if args.command == 'list':
         files = file_ops.list_files(args.dir)
         if files:
-            logger.info(f"Files in directory '{args.dir or 'artifacts'}':")
+            logger.info("Files in directory '%s':", args.dir or 'artifacts')
             for file in files:
-                logger.info(f"  - {file}")
+                logger.info("  - %s", file)
         else:
-            logger.info(f"No files found in directory '{args.dir or 'artifacts'}'")
+            logger.info("No files found in directory '%s'", args.dir or 'artifacts')
     
     elif args.command == 'read':
         content = file_ops.read_file(args.filename)
         if content is not None:
-            logger.info(f"Content of '{args.filename}':")
+            logger.info("Content of '%s':", args.filename)
             print("\n---FILE CONTENT BEGIN---")
             print(content)
             print("---FILE CONTENT END---\n")
         else:
-            logger.error(f"Could not read file '{args.filename}'")
+            logger.error("Could not read file '%s'", args.filename)
     
     elif args.command == 'write':
         success = file_ops.write_file(args.filename, args.content, args.overwrite)
         if success:
-            logger.info(f"Successfully wrote to file '{args.filename}'")
+            logger.info("Successfully wrote to file '%s'", args.filename)
         else:
-            logger.error(f"Failed to write to file '{args.filename}'")
+            logger.error("Failed to write to file '%s'", args.filename)
     
     elif args.command == 'append':
         success = file_ops.append_to_file(args.filename, args.content, args.create)
         if success:
-            logger.info(f"Successfully appended to file '{args.filename}'")
+            logger.info("Successfully appended to file '%s'", args.filename)
         else:
-            logger.error(f"Failed to append to file '{args.filename}'")
+            logger.error("Failed to append to file '%s'", args.filename)
     
     elif args.command == 'edit':
         success = file_ops.edit_file(args.filename, args.find, args.replace)
         if success:
-            logger.info(f"Successfully edited file '{args.filename}'")
+            logger.info("Successfully edited file '%s'", args.filename)
         else:
-            logger.error(f"Failed to edit file '{args.filename}'")
+            logger.error("Failed to edit file '%s'", args.filename)
     
     elif args.command == 'delete':
         success = file_ops.delete_file(args.filename)
         if success:
-            logger.info(f"Successfully deleted file '{args.filename}'")
+            logger.info("Successfully deleted file '%s'", args.filename)
         else:
-            logger.error(f"Failed to delete file '{args.filename}'")
+            logger.error("Failed to delete file '%s'", args.filename)
     
     elif args.command == 'mkdir':
         success = file_ops.create_directory(args.directory)
         if success:
-            logger.info(f"Successfully created directory '{args.directory}'")
+            logger.info("Successfully created directory '%s'", args.directory)
         else:
-            logger.error(f"Failed to create directory '{args.directory}'")
+            logger.error("Failed to create directory '%s'", args.directory)
     
     elif args.command == 'copy':
         success = file_ops.copy_file(args.source, args.destination)
         if success:
-            logger.info(f"Successfully copied '{args.source}' to '{args.destination}'")
+            logger.info("Successfully copied '%s' to '%s'", args.source, args.destination)
         else:
-            logger.error(f"Failed to copy '{args.source}' to '{args.destination}'")
+            logger.error("Failed to copy '%s' to '%s'", args.source, args.destination)
     
     elif args.command == 'move':
         success = file_ops.move_file(args.source, args.destination)
         if success:
-            logger.info(f"Successfully moved '{args.source}' to '{args.destination}'")
+            logger.info("Successfully moved '%s' to '%s'", args.source, args.destination)
         else:
-            logger.error(f"Failed to move '{args.source}' to '{args.destination}'")
+            logger.error("Failed to move '%s' to '%s'", args.source, args.destination)
     
     elif args.command == 'search':
         results = file_ops.search_files(args.text, args.dir)
         if results:
-            logger.info(f"Files containing '{args.text}':")
+            logger.info("Files containing '%s':", args.text)
             for file in results:
-                logger.info(f"  - {file}")
+                logger.info("  - %s", file)
         else:
-            logger.info(f"No files containing '{args.text}' found")
+            logger.info("No files containing '%s' found", args.text)
     
     else:
         parser.print_help()
@@ -1,11 +1,12 @@
-from pydub import AudioSegment
-from pydub.playback import play
+import hashlib
 import os
+import queue
+import subprocess
+from pathlib import Path
 import edge_tts
 import asyncio
-import tempfile
-import time
 import aiohttp
+from concurrent.futures import ThreadPoolExecutor
 # Import the new logger configuration
 from logger_config import get_logger
 
@@ -14,10 +15,101 @@ logger = get_logger(__name__)
 
 default_voice = "en-GB-RyanNeural"
 fallback_voice = "en-US-ChristopherNeural"  # Fallback voice if primary fails
+# Seconds allowed for the first audio to arrive, and then for the rest of it
+TTS_TIMEOUT = 10
+
+# Short phrases recur ("Timer complete!", "Marvin online"), so their audio is kept
+# on disk and replayed without a round trip to Edge TTS. The gain is applied at
+# playback, so it isn't part of the key.
+TTS_CACHE_DIR = Path(__file__).resolve().parent / 'cache' / 'tts'
+TTS_CACHE_MAX_CHARS = 200
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Playback blocks until the audio finishes, so it gets its own thread rather than
+# sharing the default pool (one worker also keeps utterances from overlapping).
+_playback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts')
+
+def _play_stream(chunks, gain_db):
+    """
+    Pipe MP3 chunks from a queue into ffplay as they arrive, blocking until
+    playback finishes. A None in the queue marks the end of the audio.
+    """
+    # ffplay decodes and applies the gain itself, so the audio never passes
+    # through Python as PCM
+    command = ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet', '-f', 'mp3']
+    if gain_db:
+        # No gain means no filter graph to set up
+        command += ['-af', f'volume={gain_db}dB']
+    player = subprocess.Popen(
+        command + ['-i', '-'],
+        stdin=subprocess.PIPE,
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    )
+    try:
+        while (chunk := chunks.get()) is not None:
+            player.stdin.write(chunk)
+    except BrokenPipeError:
+        logger.warning("ffplay exited before the audio ended")
+    finally:
+        try:
+            player.stdin.close()
+        except BrokenPipeError:
+            pass
+        player.wait()
+
+def _cache_path(voice, text):
+    key = hashlib.blake2b(f"{voice}|{text}".encode('utf-8'), digest_size=16).hexdigest()
+    return TTS_CACHE_DIR / f"{key}.mp3"
+
+def _read_cached(path):
+    """Cached audio for a phrase, or None. Touches the file so recently used phrases are kept."""
+    try:
+        data = path.read_bytes()
+        os.utime(path)
+        return data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error("Error reading TTS cache: %s", e)
+        return None
+
+def _store_cached(path, data):
+    """Save a phrase's audio, then drop the least recently used files over the size limit."""
+    try:
+        TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        
+        entries = [(entry.stat(), entry) for entry in TTS_CACHE_DIR.glob('*.mp3')]
+        total = sum(stat.st_size for stat, _ in entries)
+        if total > TTS_CACHE_MAX_BYTES:
+            for stat, entry in sorted(entries, key=lambda item: item[0].st_mtime):
+                entry.unlink(missing_ok=True)
+                total -= stat.st_size
+                if total <= TTS_CACHE_MAX_BYTES:
+                    break
+    except Exception as e:
+        logger.error("Error writing TTS cache: %s", e)
+
+async def _play_audio(data, gain_db):
+    chunks = queue.SimpleQueue()
+    chunks.put(data)
+    chunks.put(None)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_playback_executor, _play_stream, chunks, gain_db)
+
+async def _next_audio(stream):
+    """The next audio chunk from an Edge TTS stream, or None at the end."""
+    async for chunk in stream:
+        if chunk["type"] == "audio":
+            return chunk["data"]
+    return None
 
 async def speak_text(text: str, voice=default_voice, gain_db=5, max_retries=2):
     """
     Convert text to speech and play it with volume adjustment.
+    Playback starts with the first audio chunk, while the rest is still arriving.
     Includes error handling and retry logic for Edge TTS service issues.
     
     Args:
@@ -26,73 +118,81 @@ async def speak_text(text: str, voice=default_voice, gain_db=5, max_retries=2):
         gain_db: Volume adjustment in decibels
         max_retries: Maximum number of retry attempts for TTS service
     """
-    # Create a unique temporary file for each TTS request
-    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-        tts_file = temp_file.name
-    
-    # Track if we've successfully generated speech
-    success = False
-    
-    try:
-        # Try with primary voice first
-        for attempt in range(max_retries + 1):
+    cache_path = _cache_path(voice, text) if len(text) <= TTS_CACHE_MAX_CHARS else None
+    if cache_path is not None:
+        cached = await asyncio.to_thread(_read_cached, cache_path)
+        if cached is not None:
+            logger.debug("TTS cache hit for: %s", text)
             try:
-                current_voice = voice if attempt == 0 else fallback_voice
-                logger.debug(f"TTS attempt {attempt+1}/{max_retries+1} using voice: {current_voice}")
-                
-                communicate = edge_tts.Communicate(text, voice=current_voice)
-                
-                # Set timeout for the TTS request
-                timeout = aiohttp.ClientTimeout(total=10)  # 10 second timeout
-                
-                # Try to save the speech with timeout
-                try:
-                    await asyncio.wait_for(communicate.save(tts_file), timeout=10)
-                    success = True
-                    logger.debug(f"TTS generation successful with {current_voice}")
-                    break  # Exit the retry loop if successful
-                except asyncio.TimeoutError:
-                    logger.warning(f"TTS request timed out with voice {current_voice}")
-                    continue  # Try next attempt
-                
-            except aiohttp.ClientConnectorError as e:
-                logger.error(f"Network connection error with Edge TTS: {e}")
-                await asyncio.sleep(1)  # Wait before retry
-            except aiohttp.WSServerHandshakeError as e:
-                logger.error(f"Edge TTS service error (HTTP {e.status}): {e.message}")
-                await asyncio.sleep(1)  # Wait before retry
+                await _play_audio(cached, gain_db)
             except Exception as e:
-                logger.error(f"Unexpected error with Edge TTS: {e}")
-                await asyncio.sleep(1)  # Wait before retry
-        
-        # If we couldn't generate speech after all retries, use a fallback message
-        if not success:
-            logger.warning("All TTS attempts failed, using text output only")
-            print(f"Marvin says: {text}")
+                logger.error("Error playing audio: %s", e)
+                print(f"Marvin says: {text}")
             return
-        
-        # Load and play the audio file if we successfully generated it
+    
+    stream = None
+    first_chunk = None
+    
+    # Retry until the first audio arrives; after that the stream is already playing
+    for attempt in range(max_retries + 1):
         try:
-            # Load the audio file
-            audio = AudioSegment.from_file(tts_file, format="mp3")
+            current_voice = voice if attempt == 0 else fallback_voice
+            logger.debug("TTS attempt %d/%d using voice: %s", attempt + 1, max_retries + 1, current_voice)
             
-            # Increase volume by gain_db decibels
-            louder_audio = audio + gain_db
-
-            # Play the louder audio
-            play(louder_audio)
+            stream = edge_tts.Communicate(text, voice=current_voice).stream()
             
-            # Small delay to ensure file is not in use
-            time.sleep(0.1)
-        except Exception as e:
-            logger.error(f"Error playing audio: {e}")
-            # Still show the text as fallback
-            print(f"Marvin says: {text}")
+            try:
+                first_chunk = await asyncio.wait_for(_next_audio(stream), timeout=TTS_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("TTS request timed out with voice %s", current_voice)
+                continue  # Try next attempt
+            
+            if first_chunk is not None:
+                logger.debug("TTS generation started with %s", current_voice)
+                break  # Exit the retry loop if successful
+            logger.warning("TTS returned no audio with voice %s", current_voice)
             
+        except aiohttp.ClientConnectorError as e:
+            logger.error("Network connection error with Edge TTS: %s", e)
+            await asyncio.sleep(1)  # Wait before retry
+        except aiohttp.WSServerHandshakeError as e:
+            logger.error("Edge TTS service error (HTTP %s): %s", e.status, e.message)
+            await asyncio.sleep(1)  # Wait before retry
+        except Exception as e:
+            logger.error("Unexpected error with Edge TTS: %s", e)
+            await asyncio.sleep(1)  # Wait before retry
+    
+    # If we couldn't generate speech after all retries, use a fallback message
+    if first_chunk is None:
+        logger.warning("All TTS attempts failed, using text output only")
+        print(f"Marvin says: {text}")
+        return
+    
+    chunks = queue.SimpleQueue()
+    chunks.put(first_chunk)
+    audio = [first_chunk]
+    complete = False
+    loop = asyncio.get_running_loop()
+    playback = loop.run_in_executor(_playback_executor, _play_stream, chunks, gain_db)
+    try:
+        async with asyncio.timeout(TTS_TIMEOUT):
+            while (chunk := await _next_audio(stream)) is not None:
+                chunks.put(chunk)
+                audio.append(chunk)
+        complete = True
+    except Exception as e:
+        # Whatever already arrived still plays
+        logger.error("Edge TTS stream interrupted: %s", e)
     finally:
-        # Always try to clean up the file, but don't crash if we can't
-        try:
-            if os.path.exists(tts_file):
-                os.remove(tts_file)
-        except (FileNotFoundError, PermissionError) as e:
-            logger.debug(f"Could not remove temporary file: {e}")
+        chunks.put(None)
+    
+    # Only cache complete audio in the voice that was asked for
+    if complete and cache_path is not None and current_voice == voice:
+        await asyncio.to_thread(_store_cached, cache_path, b"".join(audio))
+    
+    try:
+        await playback
+    except Exception as e:
+        logger.error("Error playing audio: %s", e)
+        # Still show the text as fallback
+        print(f"Marvin says: {text}")
@@ -1,7 +1,83 @@
-import playsound
-import time
+"""
+waiting_sound.py - Loops a short sound while Marvin is busy.
+The sound is loaded as PCM once, on first use, and then played from memory.
+A waiting_sound.wav next to this file is read as is; otherwise the MP3 is
+decoded with ffmpeg. To skip the decode, convert it once with:
+    ffmpeg -i waiting_sound.mp3 -acodec pcm_s16le waiting_sound.wav
+"""
+
+import subprocess
+import wave
+from functools import lru_cache
+from pathlib import Path
+import pyaudio
+from logger_config import get_logger
+
+# Get a logger for this module
+logger = get_logger(__name__)
+
+WAITING_SOUND_WAV = Path(__file__).resolve().parent / 'waiting_sound.wav'
+WAITING_SOUND_FILE = Path(__file__).resolve().parent / 'waiting_sound.mp3'
+# Format the MP3 is decoded to
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+
+@lru_cache(maxsize=1)
+def _waiting_pcm():
+    """The waiting sound as (pcm, channels, sample_width, sample_rate), loaded once."""
+    if WAITING_SOUND_WAV.exists():
+        with wave.open(str(WAITING_SOUND_WAV), 'rb') as wav:
+            pcm = wav.readframes(wav.getnframes())
+            return pcm, wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+    # Decode the MP3 with the bundled ffmpeg
+    result = subprocess.run(
+        ['ffmpeg', '-loglevel', 'quiet', '-i', str(WAITING_SOUND_FILE),
+         '-f', 's16le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), '-'],
+        check=True,
+        capture_output=True,
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    )
+    return result.stdout, CHANNELS, SAMPLE_WIDTH, SAMPLE_RATE
 
 def play_waiting_sound(stop_event):
-    while not stop_event.is_set():
-        playsound.playsound("waiting_sound.mp3", True)
-        time.sleep(0.1)
+    """Loop the waiting sound until stop_event is set."""
+    try:
+        pcm, channels, sample_width, sample_rate = _waiting_pcm()
+    except Exception as e:
+        logger.error("Error decoding waiting sound: %s", e)
+        return
+    if not pcm:
+        return
+    position = 0
+
+    def fill(in_data, frame_count, time_info, status):
+        # PortAudio asks for audio on its own thread; wrap around to loop the sound
+        nonlocal position
+        size = frame_count * channels * sample_width
+        chunk = bytearray()
+        while len(chunk) < size:
+            piece = pcm[position:position + size - len(chunk)]
+            chunk += piece
+            position = (position + len(piece)) % len(pcm)
+        return bytes(chunk), pyaudio.paContinue
+
+    audio = pyaudio.PyAudio()
+    try:
+        stream = audio.open(
+            format=audio.get_format_from_width(sample_width),
+            channels=channels,
+            rate=sample_rate,
+            output=True,
+            stream_callback=fill
+        )
+        try:
+            # Sleep until told to stop; playback needs nothing from this thread
+            stop_event.wait()
+        finally:
+            stream.stop_stream()
+            stream.close()
+    except Exception as e:
+        logger.error("Error playing waiting sound: %s", e)
+    finally:
+        audio.terminate()